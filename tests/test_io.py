@@ -4,10 +4,16 @@
 
 """Tests for `io` module."""
 
+import datetime as dt
+import pickle
+import threading
+
+import h5py
 import numpy as np
+import pytest
 import xarray as xr
 
-from xradar.io import open_cfradial1_datatree, open_odim_datatree
+from xradar.io import load_volume, open_cfradial1_datatree, open_odim_datatree
 from xradar.model import (
     non_standard_sweep_dataset_vars,
     required_sweep_metadata_vars,
@@ -183,3 +189,1047 @@ def test_open_odim_dataset(odim_file):
         backend_kwargs=dict(first_dim="auto"),
     )
     assert dict(ds.dims) == {"azimuth": 360, "range": 280}
+
+
+def test_open_odim_datatree_single_file_handle(odim_file, monkeypatch):
+    import h5netcdf
+
+    opened = []
+
+    class CountingFile(h5netcdf.File):
+        def __init__(self, *args, **kwargs):
+            opened.append(args[0])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(h5netcdf, "File", CountingFile)
+    dtree = open_odim_datatree(odim_file)
+    assert len(dtree.groups[1:]) == 14
+    assert dtree.attrs["Conventions"] == "ODIM_H5/V2_2"
+    dtree["sweep_0"].ds.DBZH.load()
+    assert len(opened) == 1
+
+
+def test_open_odim_datatree_lazy_root(odim_file, monkeypatch):
+    from xradar.io.backends.odim import H5NetCDFArrayWrapper
+
+    reads = []
+    getitem = H5NetCDFArrayWrapper._getitem
+
+    def counting_getitem(self, key):
+        reads.append(self.variable_name)
+        return getitem(self, key)
+
+    monkeypatch.setattr(H5NetCDFArrayWrapper, "_getitem", counting_getitem)
+    dtree = open_odim_datatree(odim_file)
+    # root is built from attributes, no moment data is read
+    assert reads == []
+    with h5py.File(odim_file) as f:
+        what = [f[f"dataset{i}/what"].attrs for i in range(1, 15)]
+        end = max((w["enddate"] + w["endtime"]).decode() for w in what)
+    end = dt.datetime.strptime(end, "%Y%m%d%H%M%S").strftime("%Y-%m-%dT%H:%M:%SZ")
+    assert dtree["time_coverage_end"].item() == end
+    dtree["sweep_0"].ds.DBZH.load()
+    assert reads
+
+
+@pytest.mark.parametrize("buffer", [bytes, bytearray, memoryview])
+def test_open_odim_bytes(odim_file, buffer):
+    with open(odim_file, "rb") as f:
+        image = buffer(f.read())
+    dtree = open_odim_datatree(image)
+    dtree0 = open_odim_datatree(odim_file)
+    assert dtree.groups == dtree0.groups
+    for grp in dtree.groups:
+        xr.testing.assert_identical(dtree[grp].ds, dtree0[grp].ds)
+    ds = xr.open_dataset(image, engine="odim", group="dataset1")
+    xr.testing.assert_identical(ds, dtree0["sweep_0"].to_dataset())
+    # file image is pickled as bytes
+    pickle.loads(pickle.dumps(ds)).load()
+
+
+def _bgzf_compress(raw, blocksize=2**16 - 2**10):
+    # concatenated gzip members with BC extra field (block size), as written by
+    # bgzip
+    import struct
+    import zlib
+
+    out = []
+    for i in range(0, len(raw), blocksize):
+        block = raw[i : i + blocksize]
+        comp = zlib.compressobj(6, zlib.DEFLATED, -15)
+        cdata = comp.compress(block) + comp.flush()
+        bsize = 18 + len(cdata) + 8
+        header = b"\x1f\x8b\x08\x04" + bytes(4) + b"\x00\xff"
+        header += struct.pack("<H2sHH", 6, b"BC", 2, bsize - 1)
+        out.append(header + cdata + struct.pack("<II", zlib.crc32(block), len(block)))
+    return b"".join(out)
+
+
+def test_get_bgzf_members(odim_file, tmp_path, monkeypatch):
+    import gzip
+
+    from xradar.io.backends import common
+
+    with open(odim_file, "rb") as f:
+        raw = f.read()
+    data = _bgzf_compress(raw)
+    members = common._get_bgzf_members(data)
+    assert len(members) == -(-len(raw) // (2**16 - 2**10))
+    assert members[0][0] == 0 and members[-1][1] == len(data)
+    assert all(hi == lo for (_, hi, _), (lo, _, _) in zip(members, members[1:]))
+    assert sum(size for _, _, size in members) == len(raw)
+    # valid gzip, readable by the standard library
+    assert gzip.decompress(data) == raw
+
+    # plain gzip and truncated data are no BGZF
+    assert common._get_bgzf_members(gzip.compress(raw)) is None
+    assert common._get_bgzf_members(data[:100]) is None
+
+    calls = []
+    decompress_members = common._decompress_members
+
+    def _decompress_members(data, members, *args):
+        calls.append(len(members))
+        return decompress_members(data, members, *args)
+
+    monkeypatch.setattr(common, "_decompress_members", _decompress_members)
+    filename = tmp_path / "volume.h5.gz"
+    filename.write_bytes(data)
+    assert common._decompress_file(filename, "gzip", max_workers=2) == raw
+    assert calls == [len(members)]
+
+
+@pytest.mark.parametrize(
+    "engine, compression",
+    [
+        ("odim", "gzip"),
+        ("odim", "bgzf"),
+        ("cfradial1", "gzip"),
+        ("cfradial1", "bgzf"),
+        ("cfradial1", "bz2"),
+        ("cfradial1", "bz2-multistream"),
+    ],
+)
+def test_open_compressed(odim_file, cfradial1_file, tmp_path, engine, compression):
+    import bz2
+    import gzip
+
+    filename = odim_file if engine == "odim" else cfradial1_file
+    opener = open_odim_datatree if engine == "odim" else open_cfradial1_datatree
+    with open(filename, "rb") as f:
+        raw = f.read()
+    if compression == "gzip":
+        data, suffix = gzip.compress(raw), ".gz"
+    elif compression == "bgzf":
+        data, suffix = _bgzf_compress(raw), ".gz"
+    elif compression == "bz2":
+        data, suffix = bz2.compress(raw), ".bz2"
+    else:
+        # independent streams, as written by pbzip2
+        size = len(raw) // 4 + 1
+        data = b"".join(
+            bz2.compress(raw[i : i + size]) for i in range(0, len(raw), size)
+        )
+        suffix = ".bz2"
+    compressed = tmp_path / f"volume{suffix}"
+    compressed.write_bytes(data)
+
+    dtree0 = opener(filename)
+    for workers in [None, 2]:
+        dtree = opener(compressed, file_decompress_workers=workers)
+        assert dtree.groups == dtree0.groups
+        for grp in dtree.groups:
+            xr.testing.assert_identical(dtree[grp].ds, dtree0[grp].ds)
+    with pytest.raises(ValueError, match="exceeds memory budget"):
+        opener(compressed, max_memory=len(raw) // 2)
+
+
+@pytest.mark.parametrize("engine", ["odim", "cfradial1"])
+def test_open_datatree_eager(odim_file, cfradial1_file, tmp_path, engine):
+    import shutil
+
+    filename = odim_file if engine == "odim" else cfradial1_file
+    opener = open_odim_datatree if engine == "odim" else open_cfradial1_datatree
+    copy = tmp_path / "volume"
+    shutil.copy(filename, copy)
+    dtree = opener(copy, load="eager")
+    # in-memory datatree, the file is not needed anymore
+    copy.unlink()
+    dtree0 = opener(filename)
+    assert dtree.groups == dtree0.groups
+    for grp in dtree.groups:
+        assert all(var._in_memory for var in dtree[grp].ds.variables.values())
+        xr.testing.assert_identical(dtree[grp].ds, dtree0[grp].ds)
+    with pytest.raises(ValueError, match="unknown load mode"):
+        opener(filename, load="fast")
+
+
+@pytest.mark.parametrize("chunks", [{}, {"time": 90, "range": 100}])
+def test_open_odim_datatree_sweep_graph(odim_file, chunks):
+    kwargs = dict(sweep=[0, 3], chunks=chunks)
+    dtree = open_odim_datatree(odim_file, dask_graph="sweep", **kwargs)
+    dtree0 = open_odim_datatree(odim_file, **kwargs)
+    for grp in dtree.groups[1:]:
+        ds, ds0 = dtree[grp].to_dataset(), dtree0[grp].to_dataset()
+        moments = [k for k, v in ds0.data_vars.items() if v.chunks]
+        assert all(ds[k].chunks == ds0[k].chunks for k in moments)
+        # one read task per chunk of rays for all moments
+        graph = dict(ds[moments[0]].data.__dask_graph__())
+        reads = {k for k in graph if k[0].startswith("xradar-read-")}
+        assert len(reads) == len(ds[moments[0]].chunks[0])
+        xr.testing.assert_identical(ds.load(), ds0.load())
+    with pytest.raises(ValueError, match="unknown dask_graph"):
+        open_odim_datatree(odim_file, dask_graph="moment")
+
+
+class _CountingLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def acquire(self, *args, **kwargs):
+        self.count += 1
+        return self._lock.acquire(*args, **kwargs)
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+@pytest.mark.parametrize("chunks", [{}, {"time": 90}])
+@pytest.mark.parametrize("first_dim", ["time", "auto"])
+def test_open_odim_datatree_sweep_graph_lock(odim_file, chunks, first_dim):
+    import dask
+
+    lock = _CountingLock()
+    kwargs = dict(sweep=[0], chunks=chunks, first_dim=first_dim)
+    dtree = open_odim_datatree(odim_file, dask_graph="sweep", lock=lock, **kwargs)
+    ds = dtree["sweep_0"].to_dataset()
+    moments = [k for k, v in ds.data_vars.items() if v.chunks]
+    assert len(moments) > 1
+    ntasks = len(ds[moments[0]].chunks[0])
+    lock.count = 0
+    # raw data of all moments is read under one lock per read task
+    with dask.config.set(scheduler="threads"):
+        values = dask.compute(*[ds[k].data for k in moments])
+    assert lock.count == ntasks
+    ds0 = open_odim_datatree(odim_file, **kwargs)["sweep_0"].to_dataset()
+    for k, v in zip(moments, values):
+        np.testing.assert_array_equal(v, ds0[k].values)
+
+
+def test_open_odim_datatree_sweep_graph_keys(odim_file):
+    import dask
+
+    kwargs = dict(sweep=[0], chunks={}, dask_graph="sweep")
+    ds = open_odim_datatree(odim_file, **kwargs)["sweep_0"].to_dataset()
+    raw = open_odim_datatree(odim_file, decode_dtype="raw", **kwargs)
+    raw = raw["sweep_0"].to_dataset()
+    # different open options give different dask keys
+    assert ds.DBZH.data.name != raw.DBZH.data.name
+    same = open_odim_datatree(odim_file, **kwargs)["sweep_0"].to_dataset()
+    assert ds.DBZH.data.name == same.DBZH.data.name
+    dbzh, dbzh_raw = dask.compute(ds.DBZH.data, raw.DBZH.data)
+    assert dbzh.dtype == ds.DBZH.dtype
+    assert dbzh_raw.dtype == "uint8"
+    np.testing.assert_array_equal(dbzh_raw, raw.DBZH.values)
+    np.testing.assert_array_equal(dbzh, ds.DBZH.values)
+
+
+@pytest.mark.parametrize("chunks", [None, {}])
+@pytest.mark.parametrize("engine", ["odim", "cfradial1"])
+def test_load_volume(odim_file, cfradial1_file, engine, chunks):
+    filename = odim_file if engine == "odim" else cfradial1_file
+    opener = open_odim_datatree if engine == "odim" else open_cfradial1_datatree
+    dtree = opener(filename, chunks=chunks)
+    unloaded = {
+        id(var): var
+        for node in dtree.subtree
+        for var in node.variables.values()
+        if not var._in_memory
+    }.values()
+    info = load_volume(dtree, max_workers=4)
+    dtree0 = opener(filename).load()
+    assert info.variables == len(unloaded) > 0
+    assert info.nbytes == sum(var.nbytes for var in unloaded)
+    assert info.elapsed > 0
+    for grp in dtree.groups:
+        assert all(var._in_memory for var in dtree[grp].variables.values())
+        xr.testing.assert_identical(dtree[grp].to_dataset(), dtree0[grp].to_dataset())
+    # nothing left to load
+    assert load_volume(dtree).variables == 0
+
+
+def test_open_cfradial1_datatree_eager_selected(cfradial1_file, monkeypatch):
+    from xarray.backends.netCDF4_ import NetCDF4ArrayWrapper
+
+    reads = []
+    getitem = NetCDF4ArrayWrapper._getitem
+
+    def counting_getitem(self, key):
+        reads.append((self.variable_name, key))
+        return getitem(self, key)
+
+    monkeypatch.setattr(NetCDF4ArrayWrapper, "_getitem", counting_getitem)
+    dtree = open_cfradial1_datatree(cfradial1_file, sweep=[1], load="eager")
+    with xr.open_dataset(cfradial1_file) as root:
+        start = root.sweep_start_ray_index.values[1]
+        stop = root.sweep_end_ray_index.values[1] + 1
+    # only the rays of the selected sweep are read
+    assert [key for name, key in reads if name == "DBZ"] == [
+        (slice(start, stop, 1), slice(None))
+    ]
+    ref = open_cfradial1_datatree(cfradial1_file, sweep=[1])
+    assert all(var._in_memory for var in dtree["sweep_0"].variables.values())
+    xr.testing.assert_identical(
+        dtree["sweep_0"].to_dataset(), ref["sweep_0"].to_dataset()
+    )
+
+
+def test_odim_store_shared_metadata(odim_file):
+    from xradar.io.backends.odim import OdimStore
+
+    store = OdimStore.open(odim_file, group="dataset1", phony_dims="access")
+    assert all(sub.root is store.root for sub in store.substore)
+    # derived coordinates are calculated only once
+    assert store.root.azimuth is store.root.azimuth
+    assert store.root.ray_times is store.root.ray_times
+    assert store.root.range is store.root.range
+
+
+@pytest.mark.parametrize("parallel", [False, True, "thread"])
+def test_open_odim_datatree_parallel(odim_file, parallel):
+    dtree = open_odim_datatree(odim_file, parallel=parallel, max_workers=4)
+    dtree0 = open_odim_datatree(odim_file)
+    assert dtree.groups == dtree0.groups
+    for grp in dtree.groups[1:]:
+        xr.testing.assert_identical(dtree[grp].ds, dtree0[grp].ds)
+    with pytest.raises(ValueError, match="not supported for sweeps"):
+        open_odim_datatree(odim_file, parallel="process")
+
+
+@pytest.mark.parametrize("parallel", [False, True, "thread"])
+def test_open_cfradial1_datatree_parallel(cfradial1_file, parallel):
+    dtree = open_cfradial1_datatree(cfradial1_file, parallel=parallel, max_workers=4)
+    dtree0 = open_cfradial1_datatree(cfradial1_file)
+    assert dtree.groups == dtree0.groups
+    for grp in dtree.groups[1:]:
+        xr.testing.assert_identical(dtree[grp].ds, dtree0[grp].ds)
+    with pytest.raises(ValueError, match="not supported for sweeps"):
+        open_cfradial1_datatree(cfradial1_file, parallel="process")
+
+
+def test_open_odim_rotated_sweep(odim_file, monkeypatch):
+    from xradar.io.backends import odim
+    from xradar.io.backends.common import _get_rotation
+
+    assert _get_rotation(np.array([1, 2, 3])) == 0
+    assert _get_rotation(np.array([3, 4, 1, 2])) == 2
+    assert _get_rotation(np.array([3, 1, 2, 1])) is None
+    assert _get_rotation(np.array([2, 3, 1, 2])) is None
+
+    ds = xr.open_dataset(odim_file, group="dataset1", engine="odim")
+    with h5py.File(odim_file) as f:
+        a1gate = f["dataset1/where"].attrs["a1gate"]
+    assert ds.azimuth.values[0] == pytest.approx(a1gate + 0.5)
+    monkeypatch.setattr(odim, "_sortby_dim", lambda ds, dim: ds.sortby(dim))
+    ds0 = xr.open_dataset(odim_file, group="dataset1", engine="odim")
+    xr.testing.assert_identical(ds, ds0)
+    for sel in [slice(10, 100), slice(300, 400), slice(None, None, 7), [3, 359]]:
+        xr.testing.assert_identical(ds.isel(time=sel), ds0.isel(time=sel))
+
+
+@pytest.mark.parametrize(
+    "angles, res, full_range, circular, nrays, start, missing",
+    [
+        # full circle, jitter, missing and duplicate rays, starting at a1gate
+        (
+            np.insert(np.delete((np.arange(360) + 137.5) % 360, [10, 50]), 99, 236.6),
+            1.0,
+            360,
+            True,
+            360,
+            0.5,
+            2,
+        ),
+        # sector crossing north
+        ((np.arange(330, 390) + 0.5) % 360, 1.0, 360, True, 60, 330.5, 0),
+        # rhi sector and full rhi with missing rays
+        (np.arange(0, 30, 0.5) + 0.25, 0.5, 90, False, 60, 0.25, 0),
+        (np.arange(2, 89) + 0.5, 1.0, 90, False, 90, 0.5, 3),
+        # beam centers at full degrees
+        (np.arange(360.0), 1.0, 360, True, 360, 0.0, 0),
+    ],
+)
+def test_get_angle_grid(angles, res, full_range, circular, nrays, start, missing):
+    from xradar.io.backends.common import _get_angle_grid
+
+    grid, index = _get_angle_grid(angles, res, full_range, circular=circular)
+    assert len(grid) == nrays
+    assert grid[0] == start
+    assert np.count_nonzero(index < 0) == missing
+    valid = index >= 0
+    np.testing.assert_allclose(angles[index[valid]], grid[valid], atol=0.4)
+
+
+def test_regularize_angle(tmp_path):
+    from xradar.io.backends.common import _regularize_angle
+
+    rng = np.random.default_rng(42)
+    azimuth = (np.arange(360) + 137.5) % 360 + rng.uniform(-0.1, 0.1, 360)
+    azimuth = np.insert(np.delete(azimuth, [10, 11, 50]), 100, azimuth[100] + 0.05)
+    nrays = len(azimuth)
+    ds = xr.Dataset(
+        {
+            "DBZH": (("azimuth", "range"), rng.random((nrays, 4), dtype="float32")),
+            "RAW": (
+                ("azimuth", "range"),
+                np.arange(nrays * 4, dtype="int16").reshape(nrays, 4),
+                {"_FillValue": np.int16(-1)},
+            ),
+        },
+        coords={
+            "azimuth": ("azimuth", azimuth),
+            "elevation": ("azimuth", np.full(nrays, 0.5)),
+            "range": np.arange(4.0),
+        },
+    )
+    out = _regularize_angle(ds)
+    np.testing.assert_allclose(out.azimuth, np.arange(360) + 0.5)
+    assert out.RAW.dtype == "int16"
+    assert np.count_nonzero((out.RAW == -1).all("range")) == 3
+    assert np.count_nonzero(out.DBZH.isnull().all("range")) == 3
+
+    # lazy and dask data give the same result as in-memory data
+    ds.to_netcdf(tmp_path / "sweep.nc")
+    kwargs = dict(mask_and_scale=False)
+    with xr.open_dataset(tmp_path / "sweep.nc", **kwargs) as mem:
+        out = _regularize_angle(mem.load())
+    with xr.open_dataset(tmp_path / "sweep.nc", **kwargs) as lazy:
+        lazy_out = _regularize_angle(lazy)
+        assert not lazy_out.DBZH.variable._in_memory
+        sel = dict(azimuth=slice(5, 60))
+        xr.testing.assert_identical(lazy_out.isel(sel), out.isel(sel))
+        xr.testing.assert_identical(lazy_out.load(), out)
+    with xr.open_dataset(tmp_path / "sweep.nc", chunks={}, **kwargs) as dsk:
+        xr.testing.assert_identical(_regularize_angle(dsk).compute(), out)
+
+
+def test_regularize_angle_recalc_ray_times(tmp_path):
+    # volume without how/startazT, ray times are synthesized from what
+    filename = tmp_path / "duplicate_ray.h5"
+    with h5py.File(filename, "w") as f:
+        f.attrs["Conventions"] = b"ODIM_H5/V2_2"
+        f.create_group("what").attrs.update(
+            dict(date=b"20181220", time=b"060000", object=b"PVOL")
+        )
+        f.create_group("where").attrs.update(dict(lon=10.0, lat=50.0, height=100.0))
+        grp = f.create_group("dataset1")
+        grp.create_group("what").attrs.update(
+            dict(
+                startdate=b"20181220",
+                starttime=b"060000",
+                enddate=b"20181220",
+                endtime=b"060036",
+                product=b"SCAN",
+            )
+        )
+        grp.create_group("where").attrs.update(
+            dict(a1gate=0, elangle=0.5, nbins=10, nrays=361, rscale=250.0, rstart=0.0)
+        )
+        # one duplicate ray
+        startaz = np.insert(np.arange(360.0), 100, 100.0)
+        grp.create_group("how").attrs.update(
+            dict(startazA=startaz, stopazA=startaz + 1.0)
+        )
+        data = grp.create_group("data1")
+        data.create_dataset("data", data=np.zeros((361, 10), dtype="uint8"))
+        data.create_group("what").attrs.update(
+            dict(gain=0.5, offset=-32.0, nodata=255.0, undetect=0.0, quantity=b"DBZH")
+        )
+    ds = xr.open_dataset(filename, engine="odim", group="dataset1", reindex_angle=True)
+    assert ds.dims["time"] == 360
+    # ray times are recalculated for the 360 kept rays
+    np.testing.assert_allclose(
+        np.diff(ds.time.values).astype("timedelta64[ns]").astype(float), 1e8, rtol=1e-5
+    )
+
+
+def test_open_odim_moments(odim_file):
+    ds = xr.open_dataset(
+        odim_file, group="dataset1", engine="odim", moments=["DBZH", "VRADH"]
+    )
+    assert set(ds.data_vars) & (
+        sweep_dataset_vars | non_standard_sweep_dataset_vars
+    ) == {"DBZH", "VRADH"}
+
+    dtree = open_odim_datatree(odim_file, moments=["DBZH"])
+    for grp in dtree.groups[1:]:
+        ds = dtree[grp].ds
+        assert set(ds.data_vars) & (
+            sweep_dataset_vars | non_standard_sweep_dataset_vars
+        ) == {"DBZH"}
+
+
+@pytest.mark.parametrize("decode_dtype", ["float32", "float64"])
+def test_open_odim_decode_dtype(odim_file, decode_dtype):
+    ref = xr.open_dataset(odim_file, group="dataset1", engine="odim")
+    ds = xr.open_dataset(
+        odim_file, group="dataset1", engine="odim", decode_dtype=decode_dtype
+    )
+    assert ds.DBZH.dtype == decode_dtype
+    assert ds.DBZH.encoding["scale_factor"] == ref.DBZH.encoding["scale_factor"]
+    xr.testing.assert_allclose(ds.DBZH, ref.DBZH.astype(decode_dtype))
+
+    ds = xr.open_dataset(odim_file, group="dataset1", engine="odim", decode_dtype="raw")
+    assert ds.DBZH.dtype == "uint8"
+    assert ds.DBZH.attrs["scale_factor"] == ref.DBZH.encoding["scale_factor"]
+    xr.testing.assert_allclose(xr.decode_cf(ds).DBZH, ref.DBZH)
+
+    with pytest.raises(ValueError):
+        xr.open_dataset(odim_file, group="dataset1", engine="odim", decode_dtype="i2")
+
+
+def test_open_cfradial1_decode_dtype(cfradial1_file):
+    dtree = open_cfradial1_datatree(cfradial1_file, decode_dtype="float32")
+    assert dtree["sweep_0"].ds.DBZ.dtype == "float32"
+
+    ds = xr.open_dataset(
+        cfradial1_file, group="sweep_0", engine="cfradial1", decode_dtype="raw"
+    )
+    assert ds.DBZ.dtype == "int16"
+    assert "scale_factor" in ds.DBZ.attrs
+
+
+def test_decode_dtype_unsigned(tmp_path):
+    filename = tmp_path / "unsigned.nc"
+    root = _create_ragged_cfradial1_dataset(ray_n_gates=(3, 3, 3, 4, 4), dtype="i1")
+    data = root.DBZ.values
+    data[:3] = [-56, -1, 2]
+    root["DBZ"].attrs.update(
+        _Unsigned="true", scale_factor=0.5, add_offset=0.0, _FillValue=-1, _Undetect=2
+    )
+    root.to_netcdf(filename)
+    kwargs = dict(group="sweep_0", engine="cfradial1")
+    ref = xr.open_dataset(filename, **kwargs)
+    np.testing.assert_array_equal(ref.DBZ.values[0], [100.0, np.nan, 1.0])
+    ds = xr.open_dataset(filename, decode_dtype="float32", **kwargs)
+    xr.testing.assert_identical(ds.DBZ, ref.DBZ.astype("float32"))
+
+    raw = xr.open_dataset(filename, decode_dtype="raw", **kwargs)
+    assert raw.DBZ.dtype == "i1"
+    for chunks in [None, {}]:
+        ds = raw if chunks is None else raw.chunk(chunks)
+        ds = ds.packed.decode(dtype="float32")
+        expected = ref.DBZ.variable.astype("float32")
+        xr.testing.assert_identical(ds.DBZ.variable, expected)
+        ds = raw.packed.decode(mask_undetect=True)
+        np.testing.assert_array_equal(ds.DBZ.values[0], [100.0, np.nan, np.nan])
+
+
+@pytest.mark.parametrize("chunks", [{}, "auto"])
+def test_open_odim_preferred_chunks(odim_file, chunks):
+    ds = xr.open_dataset(odim_file, group="dataset1", engine="odim", chunks=chunks)
+    nrays, ngates = ds.DBZH.shape
+    chunksizes = ds.DBZH.encoding["chunksizes"]
+    assert ds.DBZH.encoding["preferred_chunks"] == {
+        "time": nrays,
+        "range": min(chunksizes[1], ngates),
+    }
+    # whole sweep along rays, dask chunks align with stored range chunks
+    assert ds.DBZH.chunks[0] == (nrays,)
+    assert all(c % chunksizes[1] == 0 for c in ds.DBZH.chunks[1][:-1])
+
+
+def test_odim_store_lock(odim_file, tmp_path):
+    from xarray.backends.locks import DummyLock
+
+    from xradar.io.backends.odim import HDF5_LOCK, OdimStore
+
+    other = tmp_path / "other.h5"
+    with open(odim_file, "rb") as f:
+        other.write_bytes(f.read())
+
+    # per-file locks, also after pickling
+    store1 = OdimStore.open(odim_file)
+    store2 = OdimStore.open(odim_file)
+    store3 = OdimStore.open(other)
+    assert store1.lock.lock is store2.lock.lock
+    assert store1.lock.lock is not store3.lock.lock
+    assert pickle.loads(pickle.dumps(store1.lock)).lock is store1.lock.lock
+
+    assert OdimStore.open(odim_file, lock=True).lock.lock is store1.lock.lock
+    ds = xr.open_dataset(odim_file, engine="odim", group="dataset1", lock=True)
+    xr.testing.assert_identical(
+        ds.load(), xr.open_dataset(odim_file, engine="odim", group="dataset1")
+    )
+
+    assert OdimStore.open(odim_file, lock="global").lock is HDF5_LOCK
+    assert isinstance(OdimStore.open(odim_file, lock=False).lock, DummyLock)
+    assert isinstance(OdimStore.open(odim_file, lock="process").lock, DummyLock)
+    with pytest.raises(ValueError):
+        OdimStore.open(odim_file, lock="thread")
+
+    ref = open_odim_datatree(odim_file)
+    dtree = open_odim_datatree(odim_file, parallel=True, lock=False)
+    for grp in ref.groups[1:]:
+        xr.testing.assert_identical(dtree[grp].to_dataset(), ref[grp].to_dataset())
+
+
+def test_odim_substore_metadata_locked(odim_file, monkeypatch):
+    from xradar.io.backends import odim
+
+    encoding = odim._get_h5netcdf_encoding
+    get_what = odim._get_dset_what
+
+    def locked_encoding(self, var):
+        assert odim.HDF5_LOCK.locked()
+        return encoding(self, var)
+
+    def locked_what(fileobj, group):
+        assert odim.HDF5_LOCK.locked()
+        return get_what(fileobj, group)
+
+    monkeypatch.setattr(odim, "_get_h5netcdf_encoding", locked_encoding)
+    monkeypatch.setattr(odim, "_get_dset_what", locked_what)
+    dtree = open_odim_datatree(odim_file, sweep=[0, 1, 2], parallel=True, lock="global")
+    assert len(dtree.groups[1:]) == 3
+
+
+def _write_compressed_odim(src, dst, group="dataset1"):
+    # copy of ODIM_H5 file with gzip compressed (and chunked) moments of group
+    import shutil
+
+    shutil.copy(src, dst)
+    with h5py.File(dst, "r+") as f:
+        for name, sub in f[group].items():
+            if not name.startswith(("data", "quality")):
+                continue
+            data = sub["data"][()]
+            attrs = dict(sub["data"].attrs)
+            del sub["data"]
+            chunks = (45, min(data.shape[1], 300))
+            ds = sub.create_dataset(
+                "data", data=data, compression="gzip", chunks=chunks
+            )
+            ds.attrs.update(attrs)
+    return dst
+
+
+def test_open_odim_decompress_workers(odim_file, tmp_path, monkeypatch):
+    from xradar.io.backends import odim
+
+    odim_file = _write_compressed_odim(odim_file, tmp_path / "compressed.h5")
+
+    calls = []
+    assemble = odim._assemble_chunks
+
+    def _assemble_chunks(*args, **kwargs):
+        calls.append(kwargs["max_workers"])
+        return assemble(*args, **kwargs)
+
+    monkeypatch.setattr(odim, "_assemble_chunks", _assemble_chunks)
+
+    ref = xr.open_dataset(odim_file, group="dataset1", engine="odim").load()
+    assert not calls
+    ds = xr.open_dataset(
+        odim_file, group="dataset1", engine="odim", decompress_workers=4
+    )
+    assert ds.DBZH.encoding["zlib"]
+    xr.testing.assert_identical(ds.load(), ref)
+    assert calls and set(calls) == {4}
+    assert 4 in odim._DECOMPRESS_EXECUTORS
+    for sel in [
+        {"time": 5, "range": slice(3, 700)},
+        {"time": [7, 3, 300], "range": [-1, 0]},
+    ]:
+        xr.testing.assert_identical(ds.isel(sel).load(), ref.isel(sel))
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_odim_raw_chunks(tmp_path, shuffle):
+    import h5py
+
+    from xradar.io.backends.odim import (
+        _assemble_chunks,
+        _get_chunk_selection,
+        _read_raw_chunks,
+    )
+
+    data = np.arange(360 * 500, dtype="int16").reshape(360, 500)
+    with h5py.File(tmp_path / "chunks.h5", "w") as f:
+        h5ds = f.create_dataset(
+            "data", data=data, chunks=(45, 128), compression="gzip", shuffle=shuffle
+        )
+        key = (slice(10, 300), slice(None))
+        starts, stops, _ = _get_chunk_selection(data.shape, key)
+        raw = _read_raw_chunks(h5ds, starts, stops)
+        out = _assemble_chunks(raw, starts, stops, h5ds.chunks, h5ds.dtype, shuffle)
+        np.testing.assert_array_equal(out, data[key])
+
+        # unsupported filters and keys
+        f.create_dataset("fletcher", data=data, chunks=(45, 128), fletcher32=True)
+        assert _read_raw_chunks(f["fletcher"], starts, stops) is None
+        assert _get_chunk_selection(data.shape, (slice(0, 10, 2), 0)) is None
+
+
+def test_open_odim_mmap(odim_file, tmp_path, monkeypatch):
+    import shutil
+
+    import h5py
+
+    from xradar.io.backends import odim
+
+    # rewrite moments of first sweep contiguous and unfiltered
+    fname = tmp_path / "contiguous.h5"
+    shutil.copy(odim_file, fname)
+    with h5py.File(fname, "a") as f:
+        for name, grp in f["dataset1"].items():
+            if name.startswith(("data", "quality")):
+                data = grp["data"][:]
+                attrs = dict(grp["data"].attrs)
+                del grp["data"]
+                grp.create_dataset("data", data=data).attrs.update(attrs)
+
+    offsets = []
+    get_offset = odim._get_contiguous_offset
+
+    def _get_contiguous_offset(h5ds, filename):
+        offsets.append(get_offset(h5ds, filename))
+        return offsets[-1]
+
+    monkeypatch.setattr(odim, "_get_contiguous_offset", _get_contiguous_offset)
+
+    ref = xr.open_dataset(fname, group="dataset1", engine="odim")
+    assert not offsets
+    ds = xr.open_dataset(fname, group="dataset1", engine="odim", use_mmap=True)
+    assert offsets and all(offset is not None for offset in offsets)
+    xr.testing.assert_identical(ds.load(), ref.load())
+
+    # pickled lazy dataset opened by relative path re-maps the file from
+    # another working directory
+    monkeypatch.chdir(tmp_path)
+    ds = xr.open_dataset(fname.name, group="dataset1", engine="odim", use_mmap=True)
+    sel = {"time": [7, 3, 300], "range": slice(2, 20)}
+    dumped = pickle.dumps(ds.isel(sel))
+    monkeypatch.chdir(tmp_path.parent)
+    ds = pickle.loads(dumped)
+    xr.testing.assert_identical(ds.load(), ref.isel(sel))
+
+
+@pytest.mark.parametrize("engine", ["odim", "cfradial1"])
+def test_reference_index(odim_file, cfradial1_file, tmp_path, engine):
+    from xradar.io import create_reference_index, open_reference_datatree
+
+    filename, open_datatree = {
+        "odim": (odim_file, open_odim_datatree),
+        "cfradial1": (cfradial1_file, open_cfradial1_datatree),
+    }[engine]
+    outfile = tmp_path / "reference.json"
+    index = create_reference_index(filename, engine=engine, outfile=outfile)
+    assert index["engine"] == engine
+
+    ref = open_datatree(filename)
+    dtree = open_reference_datatree(outfile)
+    assert ref.groups == dtree.groups
+    for grp in ref.groups:
+        xr.testing.assert_identical(dtree[grp].to_dataset(), ref[grp].to_dataset())
+
+    # lazy partial reads
+    sel = {"time": [7, 3, 100], "range": slice(5, 400, 3)}
+    dtree = open_reference_datatree(index, source=filename, chunks={})
+    xr.testing.assert_identical(
+        dtree["sweep_0"].to_dataset().isel(sel).load(),
+        ref["sweep_0"].to_dataset().isel(sel),
+    )
+
+
+@pytest.mark.parametrize("engine", ["odim", "cfradial1"])
+def test_scan_volume(odim_file, cfradial1_file, engine):
+    from xradar.io import scan_volume, sweep_record_dtype
+    from xradar.io.backends.common import _maybe_decode
+
+    filename, open_datatree = {
+        "odim": (odim_file, open_odim_datatree),
+        "cfradial1": (cfradial1_file, open_cfradial1_datatree),
+    }[engine]
+    record = scan_volume(filename)
+    assert record.engine == engine
+    assert record.sweeps.dtype == sweep_record_dtype
+    assert not hasattr(record, "__dict__")
+
+    dtree = open_datatree(filename)
+    assert record.nsweeps == len(dtree.groups[1:])
+    # sweeps are matched by number, not by group order
+    scanned = {rec["sweep_number"]: i for i, rec in enumerate(record.sweeps)}
+    for grp in dtree.groups[1:]:
+        ds = dtree[grp].ds
+        i = scanned[ds.sweep_number.values.item()]
+        rec = record.sweeps[i]
+        np.testing.assert_allclose(rec["fixed_angle"], ds.fixed_angle, rtol=1e-6)
+        assert rec["nrays"] == ds.dims["time"]
+        assert rec["nbins"] == ds.dims["range"]
+        assert rec["sweep_mode"] == _maybe_decode(ds.sweep_mode.values.item())
+        assert set(record.moments[i]) >= set(ds.data_vars) & (
+            sweep_dataset_vars | non_standard_sweep_dataset_vars
+        )
+    np.testing.assert_allclose(
+        [record.longitude, record.latitude, record.altitude],
+        [dtree.ds.longitude, dtree.ds.latitude, dtree.ds.altitude],
+    )
+
+
+def test_scan_volume_sweep_number(odim_file):
+    from xradar.io import scan_volume
+
+    # dataset1..dataset14, h5py iterates dataset1, dataset10, ..., dataset2, ...
+    record = scan_volume(odim_file)
+    assert list(record.sweeps["sweep_number"]) == list(range(1, 15))
+
+    dtree = open_odim_datatree(odim_file)
+    scanned = {rec["sweep_number"]: rec for rec in record.sweeps}
+    for grp in dtree.groups[1:]:
+        ds = dtree[grp].ds
+        group = ds.DBZH.encoding["group"].lstrip("/").split("/")[0]
+        rec = scanned[int(group[7:])]
+        assert rec["sweep_number"] == ds.sweep_number.values.item()
+        np.testing.assert_allclose(rec["fixed_angle"], ds.fixed_angle, rtol=1e-6)
+        assert rec["nrays"] == ds.dims["time"]
+
+
+def test_scan_volume_missing_endtime(odim_file, tmp_path):
+    import shutil
+
+    from xradar.io import scan_volume
+
+    filename = tmp_path / "volume.h5"
+    shutil.copy(odim_file, filename)
+    with h5py.File(filename, "r+") as f:
+        for grp in f:
+            if grp.startswith("dataset"):
+                del f[grp]["what"].attrs["enddate"]
+                del f[grp]["what"].attrs["endtime"]
+    record = scan_volume(filename)
+    np.testing.assert_array_equal(
+        record.sweeps["end_time"], record.sweeps["start_time"]
+    )
+
+
+def test_radar_catalog(odim_file, cfradial1_file, tmp_path):
+    import os
+    import shutil
+
+    from xradar.io import RadarCatalog
+
+    archive = tmp_path / "archive"
+    (archive / "sub").mkdir(parents=True)
+    shutil.copy(odim_file, archive / "volume.h5")
+    shutil.copy(cfradial1_file, archive / "sub" / "volume.nc")
+
+    dbfile = tmp_path / "catalog.sqlite"
+    with RadarCatalog(dbfile) as cat:
+        assert cat.update(archive) == 2
+        # unchanged files are not scanned again
+        assert cat.update(archive) == 0
+        os.utime(archive / "volume.h5", (0, 0))
+        assert cat.update(archive) == 1
+
+    # persistent
+    with RadarCatalog(dbfile) as cat:
+        assert len(cat) == 2
+        records = cat.query()
+        assert [rec.engine for rec in records] == ["cfradial1", "odim"]
+
+        recs = cat.query(start="2018-12-20T06:00", end="2018-12-20T06:07")
+        assert [rec.engine for rec in recs] == ["odim"]
+        assert not cat.query(start="2020-01-01")
+        site = (records[0].longitude, records[0].latitude)
+        assert [rec.engine for rec in cat.query(site=site)] == ["cfradial1"]
+        assert [rec.engine for rec in cat.query(moments="DBZH")] == ["odim"]
+        assert len(cat.query(elevation_range=(0, 1))) == 2
+        assert [rec.engine for rec in cat.query(fixed_angles=32.0)] == ["odim"]
+        assert not cat.query(fixed_angles=32.0, engine="cfradial1")
+        assert not cat.query(moments=["DBZH", "FOO"])
+        recs = cat.query(moments=["DBZH", "VRADH"], fixed_angles=[0.5, 32.0])
+        assert [rec.engine for rec in recs] == ["odim"]
+        assert not cat.query(elevation_range=(31.9, 32.1), fixed_angles=0.5)
+
+        # volumes and their sweeps are fetched in two statements
+        statements = []
+        cat._con.set_trace_callback(statements.append)
+        recs = cat.query(elevation_range=(0, 1), moments="DBZH")
+        cat._con.set_trace_callback(None)
+        assert len(statements) == 2
+        assert [rec.engine for rec in recs] == ["odim"]
+        assert [rec.sweeps for rec in recs][0].tolist() == records[1].sweeps.tolist()
+        assert recs[0].moments == records[1].moments
+
+        dtrees = cat.open_datatrees(engine="odim", elevation_range=(0, 1))
+        assert len(dtrees) == 1
+        elevations = [dtrees[0][grp].ds.fixed_angle for grp in dtrees[0].groups[1:]]
+        np.testing.assert_allclose(elevations, [0.5, 0.9])
+
+        os.remove(archive / "volume.h5")
+        assert cat.prune() == 1
+        assert len(cat) == 1
+
+
+def test_dataset_cache(odim_file, cfradial1_file):
+    import os
+
+    from xradar.io import disable_cache, enable_cache, get_cache
+
+    cache = enable_cache(maxsize=3)
+    try:
+        assert get_cache() is cache
+        ds1 = xr.open_dataset(odim_file, engine="odim", group="dataset1")
+        ds2 = xr.open_dataset(odim_file, engine="odim", group="dataset1")
+        assert cache.cache_info()[:2] == (1, 1)
+        assert ds1 is not ds2
+        # lazy variables are counted with their full size
+        nbytes = sum(var.nbytes for var in ds1.variables.values())
+        assert cache.cache_info().nbytes == nbytes
+        xr.testing.assert_identical(ds1.load(), ds2.load())
+
+        # different options are different entries
+        xr.open_dataset(odim_file, engine="odim", group="dataset1", moments="DBZH")
+        dtree1 = open_cfradial1_datatree(cfradial1_file)
+        dtree2 = open_cfradial1_datatree(cfradial1_file)
+        assert dtree1.groups == dtree2.groups
+        info = cache.cache_info()
+        # the datatree is cached once, not its root dataset in addition
+        assert info.hits == 2 and info.currsize == 3 and info.evictions == 0
+        assert [key[0] for key in cache._entries].count("open_cfradial1_datatree") == 1
+
+        # changed files are not served
+        stat = os.stat(odim_file)
+        os.utime(odim_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        xr.open_dataset(odim_file, engine="odim", group="dataset1", moments="DBZH")
+        assert cache.cache_info().invalidations == 2
+
+        assert cache.invalidate(cfradial1_file) == 1
+        assert cache.invalidate() == 1
+        assert len(cache) == 0
+
+        # bounded by bytes
+        cache = enable_cache(maxbytes=1)
+        xr.open_dataset(odim_file, engine="odim", group="dataset1")
+        assert len(cache) == 0
+    finally:
+        disable_cache()
+    assert get_cache() is None
+
+
+def test_open_datatree_angle_selection(odim_file, cfradial1_file):
+    dtree = open_odim_datatree(odim_file, elevation_range=(0, 2.0))
+    elevations = [dtree[grp].ds.fixed_angle.values for grp in dtree.groups[1:]]
+    np.testing.assert_allclose(elevations, [0.5, 0.9, 1.3, 1.8])
+
+    dtree = open_odim_datatree(odim_file, fixed_angles=[0.5, 32.0])
+    elevations = [dtree[grp].ds.fixed_angle.values for grp in dtree.groups[1:]]
+    np.testing.assert_allclose(elevations, [0.5, 32.0])
+
+    dtree = open_cfradial1_datatree(cfradial1_file, elevation_range=(1.0, 3.0))
+    elevations = [dtree[grp].ds.fixed_angle.values for grp in dtree.groups[1:]]
+    np.testing.assert_allclose(elevations, [1.1, 1.8, 2.6], rtol=1e-6)
+
+    dtree = open_cfradial1_datatree(cfradial1_file, fixed_angles=12.8)
+    elevations = [dtree[grp].ds.fixed_angle.values for grp in dtree.groups[1:]]
+    np.testing.assert_allclose(elevations, [12.8], rtol=1e-6)
+
+
+def test_open_cfradial1_dataset_sweep_store(cfradial1_file):
+    dtree = open_cfradial1_datatree(cfradial1_file)
+    ds = xr.open_dataset(cfradial1_file, group="sweep_8", engine="cfradial1")
+    xr.testing.assert_identical(ds, dtree["sweep_8"].to_dataset())
+    assert ds.sweep_number == 8
+
+    for group in ["sweep_9", "foo_3"]:
+        with pytest.raises(ValueError, match="missing from file"):
+            xr.open_dataset(cfradial1_file, group=group, engine="cfradial1")
+
+
+def _create_ragged_cfradial1_dataset(ray_n_gates=(3, 1, 2, 4, 2), dtype="float32"):
+    # two sweeps with 3 and 2 rays and variable number of gates per ray
+    ray_n_gates = np.array(ray_n_gates)
+    ray_start_index = np.concatenate([[0], np.cumsum(ray_n_gates)[:-1]])
+    n_points = ray_n_gates.sum()
+    return xr.Dataset(
+        {
+            "DBZ": ("n_points", np.arange(n_points, dtype=dtype)),
+            "ray_n_gates": ("time", ray_n_gates),
+            "ray_start_index": ("time", ray_start_index),
+            "sweep_start_ray_index": ("sweep", [0, 3]),
+            "sweep_end_ray_index": ("sweep", [2, 4]),
+            "sweep_mode": ("sweep", [b"azimuth_surveillance"] * 2),
+            "sweep_number": ("sweep", [0, 1]),
+            "fixed_angle": ("sweep", [0.5, 1.5]),
+            "azimuth": ("time", [10.0, 130.0, 250.0, 90.0, 270.0]),
+            "elevation": ("time", [0.5, 0.5, 0.5, 1.5, 1.5]),
+            "latitude": 50.0,
+            "longitude": 10.0,
+            "altitude": 100.0,
+        },
+        coords={
+            "time": np.arange(5).astype("datetime64[s]"),
+            "range": np.arange(4) * 100.0 + 50.0,
+        },
+    )
+
+
+@pytest.mark.parametrize("chunks", [None, {"n_points": 4}])
+def test_cfradial1_ragged_to_padded(chunks):
+    from xradar.io.backends.cfradial1 import _get_sweep_groups
+
+    root = _create_ragged_cfradial1_dataset()
+    if chunks is not None:
+        root = root.chunk(chunks)
+    sweeps = _get_sweep_groups(root)
+    nan = np.nan
+    np.testing.assert_array_equal(
+        sweeps[0].DBZ.values,
+        [[0.0, 1.0, 2.0], [3.0, nan, nan], [4.0, 5.0, nan]],
+    )
+    np.testing.assert_array_equal(
+        sweeps[1].DBZ.values,
+        [[6.0, 7.0, 8.0, 9.0], [10.0, 11.0, nan, nan]],
+    )
+    assert sweeps[1].range.size == 4
+    assert sweeps[0].DBZ.dims == ("time", "range")
+
+
+@pytest.mark.parametrize("decode", [{"mask_and_scale": False}, {"decode_dtype": "raw"}])
+def test_cfradial1_ragged_uniform_gates(tmp_path, decode):
+    # constant number of gates per sweep, no padding needed for integer data
+    filename = tmp_path / "ragged.nc"
+    root = _create_ragged_cfradial1_dataset(ray_n_gates=(3, 3, 3, 4, 4), dtype="i2")
+    root.to_netcdf(filename)
+    for group, ngates in [("sweep_0", 3), ("sweep_1", 4)]:
+        with xr.open_dataset(filename, group=group, engine="cfradial1", **decode) as ds:
+            ds = ds.load()
+        assert ds.DBZ.dtype == "i2"
+        assert ds.DBZ.shape[1] == ngates
+    np.testing.assert_array_equal(ds.DBZ.values, np.arange(9, 17).reshape(2, 4))
+
+
+@pytest.mark.parametrize("first_dim", ["time", "auto"])
+def test_cfradial1_ragged_mode(first_dim):
+    from xradar.io.backends.cfradial1 import _get_sweep_groups
+
+    root = _create_ragged_cfradial1_dataset()
+    padded = _get_sweep_groups(root, first_dim=first_dim)
+    sweeps = _get_sweep_groups(root, first_dim=first_dim, ragged=True)
+    ds = sweeps[0]
+    assert ds.DBZ.dims == ("n_points",)
+    np.testing.assert_array_equal(ds.DBZ.values, np.arange(6))
+    assert ds.ray_n_gates.dims == ds.ray_start_index.dims
+    ds = sweeps[1]
+    np.testing.assert_array_equal(ds.DBZ.values, np.arange(6, 12))
+    np.testing.assert_array_equal(ds.ray_n_gates.values, [4, 2])
+    for swp, pad in zip(sweeps, padded):
+        xr.testing.assert_identical(swp.ragged.to_padded(), pad)
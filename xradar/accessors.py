@@ -18,20 +18,22 @@ This module contains the functionality to create those accessors.
    {}
 """
 
-__all__ = ["create_xradar_dataarray_accessor"]
+__all__ = ["create_xradar_dataarray_accessor", "create_xradar_dataset_accessor"]
 
 __doc__ = __doc__.format("\n   ".join(__all__))
 
 import xarray as xr
 
+from .io.backends.common import _decode_packed, _ragged_dataset_to_padded
+
 
 def accessor_constructor(self, xarray_obj):
     self._obj = xarray_obj
 
 
 def create_function(func):
-    def function(self):
-        return func(self._obj)
+    def function(self, *args, **kwargs):
+        return func(self._obj, *args, **kwargs)
 
     return function
 
@@ -48,3 +50,15 @@ def create_xradar_dataarray_accessor(name, funcs):
     cls_name = "".join([name.capitalize(), "Accessor"])
     accessor = type(cls_name, (object,), methods)
     return xr.register_dataarray_accessor(name)(accessor)
+
+
+def create_xradar_dataset_accessor(name, funcs):
+    methods = {"__init__": accessor_constructor} | create_methods(funcs)
+    cls_name = "".join([name.capitalize(), "DatasetAccessor"])
+    accessor = type(cls_name, (object,), methods)
+    return xr.register_dataset_accessor(name)(accessor)
+
+
+# xradar provided accessors
+create_xradar_dataset_accessor("ragged", {"to_padded": _ragged_dataset_to_padded})
+create_xradar_dataset_accessor("packed", {"decode": _decode_packed})
@@ -10,8 +10,18 @@ Radar Data IO
     :maxdepth: 4
 
 .. automodule:: xradar.io.backends
+.. automodule:: xradar.io.cache
+.. automodule:: xradar.io.catalog
+.. automodule:: xradar.io.load
+.. automodule:: xradar.io.reference
+.. automodule:: xradar.io.scan
 
 """
 from .backends import *  # noqa
+from .cache import *  # noqa
+from .catalog import *  # noqa
+from .load import *  # noqa
+from .reference import *  # noqa
+from .scan import *  # noqa
 
 __all__ = [s for s in dir() if not s.startswith("_")]
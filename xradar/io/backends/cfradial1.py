@@ -27,16 +27,25 @@ Example::
 
 __all__ = [
     "CfRadial1BackendEntrypoint",
+    "CfRadial1SweepStore",
     "open_cfradial1_datatree",
 ]
 
 __doc__ = __doc__.format("\n   ".join(__all__))
 
+import os
+import re
+from functools import partial
+
+import numpy as np
 from datatree import DataTree
 from xarray import open_dataset
 from xarray.backends import NetCDF4DataStore
-from xarray.backends.common import BackendEntrypoint
+from xarray.backends.common import AbstractDataStore, BackendEntrypoint
+from xarray.backends.file_manager import CachingFileManager
 from xarray.backends.store import StoreBackendEntrypoint
+from xarray.core.utils import FrozenDict
+from xarray.core.variable import Variable
 
 from ...model import (
     non_standard_sweep_dataset_vars,
@@ -46,7 +55,21 @@ from ...model import (
     sweep_coordinate_vars,
     sweep_dataset_vars,
 )
-from .common import _attach_sweep_groups, _maybe_decode
+from ..cache import _cached, _uncached
+from .common import (
+    _assign_preferred_chunks,
+    _attach_sweep_groups,
+    _DecodeDtypeStore,
+    _decompress_file,
+    _get_compression,
+    _get_decode_dtype,
+    _get_load_mode,
+    _map_sweeps,
+    _maybe_decode,
+    _ragged_to_padded,
+    _select_sweeps_by_angle,
+    _sortby_dim,
+)
 
 
 def _get_required_root_dataset(ds):
@@ -65,7 +88,47 @@ def _get_required_root_dataset(ds):
     return root
 
 
-def _get_sweep_groups(root, sweep=None, first_dim="time"):
+def _get_sweep_indices(root, sweep=None, elevation_range=None, fixed_angles=None):
+    """Get indices of selected sweeps, only small metadata variables are read."""
+    if isinstance(sweep, str):
+        sweep = [sweep]
+    elif isinstance(sweep, int):
+        sweep = [f"sweep_{sweep}"]
+
+    # select sweeps
+    sweeps = [
+        i
+        for i in range(root.dims["sweep"])
+        if sweep is None or f"sweep_{i}" in sweep or i in sweep
+    ]
+
+    # select sweeps by angle from fixed_angle variable only
+    if elevation_range is not None or fixed_angles is not None:
+        fixed_angle = root.fixed_angle.values
+        sweep_mode = [_maybe_decode(mode) for mode in root.sweep_mode.values]
+        elevation = np.where(
+            np.array(sweep_mode) == "rhi", np.nan, fixed_angle.astype(float)
+        )
+        sweeps = _select_sweeps_by_angle(
+            sweeps,
+            elevation[sweeps],
+            fixed_angle[sweeps],
+            elevation_range=elevation_range,
+            fixed_angles=fixed_angles,
+        )
+    return sweeps
+
+
+def _get_sweep_groups(
+    root,
+    sweep=None,
+    first_dim="time",
+    parallel=False,
+    max_workers=None,
+    elevation_range=None,
+    fixed_angles=None,
+    ragged=False,
+):
     """Extract Sweep Groups.
 
     Ported from wradlib.
@@ -73,8 +136,6 @@ def _get_sweep_groups(root, sweep=None, first_dim="time"):
     # get hold of sweep start/stop indices
     start_idx = root.sweep_start_ray_index.values.astype(int)
     end_idx = root.sweep_end_ray_index.values.astype(int)
-    ray_n_gates = root.get("ray_n_gates", False)
-    ray_start_index = root.get("ray_start_index", False)
 
     # strip variables and attributes
     var = root.variables.keys()
@@ -88,74 +149,158 @@ def _get_sweep_groups(root, sweep=None, first_dim="time"):
     remove_vars &= var
     data = root.drop_vars(remove_vars)
     data.attrs = {}
-    sweep_groups = []
-    if isinstance(sweep, str):
-        sweep = [sweep]
-    elif isinstance(sweep, int):
-        sweep = [f"sweep_{sweep}"]
+    sweeps = _get_sweep_indices(
+        root, sweep=sweep, elevation_range=elevation_range, fixed_angles=fixed_angles
+    )
 
-    # iterate over sweeps
-    for i in range(root.dims["sweep"]):
-        sw = f"sweep_{i}"
-        if sweep is not None and not (sw in sweep or i in sweep):
-            continue
+    return _map_sweeps(
+        partial(
+            _get_sweep_group, root, data, start_idx, end_idx, first_dim, ragged=ragged
+        ),
+        sweeps,
+        parallel=parallel,
+        max_workers=max_workers,
+    )
 
-        # slice time and sweep dimension
-        tslice = slice(start_idx[i], end_idx[i] + 1)
-        swslice = slice(i, i + 1)
-        ds = data.isel(time=tslice, sweep=swslice).squeeze("sweep")
 
-        sweep_mode = _maybe_decode(ds.sweep_mode).compute()
-        dim0 = "elevation" if sweep_mode == "rhi" else "azimuth"
+def _scan_cfradial1_volume(filename):
+    """Scan CfRadial1 volume metadata, only small metadata variables are read.
 
-        # check and extract for variable number of gates
-        if ray_n_gates is not False:
-            # swap dimensions to correctly stack/unstack n_points = ["time", "range"]
-            ds = ds.swap_dims({"time": dim0})
-
-            current_ray_n_gates = ray_n_gates.isel(time=tslice)
-            current_rays_sum = current_ray_n_gates.sum().values.astype(int)
-            nslice = slice(
-                ray_start_index[start_idx[i]].values.astype(int),
-                ray_start_index[start_idx[i]].values.astype(int) + current_rays_sum,
-            )
-            rslice = slice(0, current_ray_n_gates[0].values.astype(int))
-            ds = ds.isel(range=rslice)
-            ds = ds.isel(n_points=nslice)
-            ds = ds.stack(n_points=[dim0, "range"])
-            ds = ds.unstack("n_points")
-            # fix elevation/time additional range dimension in coordinate
-            ds = ds.assign_coords({"elevation": ds.elevation.isel(range=0, drop=True)})
-
-        # handling first dimension
-        if first_dim == "auto":
-            if "time" in ds.dims:
-                ds = ds.swap_dims({"time": dim0})
-            ds = ds.sortby(dim0)
+    Returns
+    -------
+    site : tuple
+        Longitude, latitude and altitude of the radar site.
+    sweeps : list of tuple
+        Per sweep: sweep number, sweep mode, fixed angle, nrays, nbins, range
+        resolution, start time and end time (datetime64).
+    moments : list of tuple
+        Per sweep: moment names.
+    """
+    with open_dataset(filename, engine="cfradial1") as root:
+        start_idx = root.sweep_start_ray_index.values.astype(int)
+        end_idx = root.sweep_end_ray_index.values.astype(int)
+        # only the first and last ray times of each sweep are decoded
+        start_time = root.time[start_idx].values.astype("datetime64[ms]")
+        end_time = root.time[end_idx].values.astype("datetime64[ms]")
+        rng = root.range[:2].values
+        resolution = rng[1] - rng[0] if rng.size > 1 else np.nan
+        if "ray_n_gates" in root:
+            ray_n_gates = root.ray_n_gates.values
+            nbins = [ray_n_gates[s : e + 1].max() for s, e in zip(start_idx, end_idx)]
         else:
-            if "time" not in ds.dims:
-                ds = ds.swap_dims({dim0: "time"})
-            ds = ds.sortby("time")
+            nbins = [root.dims["range"]] * len(start_idx)
+        sweep_mode = [_maybe_decode(mode) for mode in root.sweep_mode.values]
+        fixed_angle = root.fixed_angle.values
+        # same sweep numbers as in the sweep groups of open_cfradial1_datatree
+        if "sweep_number" in root:
+            sweep_number = root.sweep_number.values.astype(int)
+        else:
+            sweep_number = np.arange(len(start_idx))
+        sweeps = [
+            (
+                sweep_number[i],
+                sweep_mode[i],
+                fixed_angle[i],
+                end_idx[i] - start_idx[i] + 1,
+                nbins[i],
+                resolution,
+                start_time[i],
+                end_time[i],
+            )
+            for i in range(len(start_idx))
+        ]
+        names = tuple(
+            k
+            for k, v in root.data_vars.items()
+            if v.dims == ("time", "range") or v.dims == ("n_points",)
+        )
+        site = tuple(
+            root[k].values.item() for k in ["longitude", "latitude", "altitude"]
+        )
+    return site, sweeps, [names] * len(sweeps)
+
+
+def _get_sweep_group(root, data, start_idx, end_idx, first_dim, i, ragged=False):
+    """Extract Sweep Group with index i.
 
-        # reassign azimuth/elevation coordinates
-        ds = ds.assign_coords({"azimuth": ds.azimuth})
-        ds = ds.assign_coords({"elevation": ds.elevation})
+    Ported from wradlib.
+    """
+    ray_n_gates = root.get("ray_n_gates", False)
+    ray_start_index = root.get("ray_start_index", False)
 
-        # assign geo-coords
-        ds = ds.assign_coords(
+    # slice time and sweep dimension
+    tslice = slice(start_idx[i], end_idx[i] + 1)
+    swslice = slice(i, i + 1)
+    ds = data.isel(time=tslice, sweep=swslice).squeeze("sweep")
+
+    sweep_mode = _maybe_decode(ds.sweep_mode).compute()
+    dim0 = "elevation" if sweep_mode == "rhi" else "azimuth"
+
+    # check and extract for variable number of gates
+    if ray_n_gates is not False:
+        current_ray_n_gates = ray_n_gates.isel(time=tslice).values.astype(int)
+        current_ray_start_index = ray_start_index.isel(time=tslice).values.astype(int)
+        ngates = int(current_ray_n_gates.max())
+        ds = ds.isel(range=slice(0, ngates))
+
+    if ray_n_gates is not False and ragged:
+        # keep flat n_points buffer of this sweep, with rebased ray offsets
+        offset = int(current_ray_start_index.min())
+        nslice = slice(offset, offset + int(current_ray_n_gates.sum()))
+        ds = ds.isel(n_points=nslice)
+        ds = ds.assign(
+            {
+                "ray_start_index": ray_start_index.isel(time=tslice).copy(
+                    data=current_ray_start_index - offset
+                ),
+                "ray_n_gates": ray_n_gates.isel(time=tslice).copy(
+                    data=current_ray_n_gates
+                ),
+            }
+        )
+    elif ray_n_gates is not False:
+        # convert ragged n_points = ["time", "range"] layout into padded arrays
+        ds = ds.assign(
             {
-                "latitude": root.latitude,
-                "longitude": root.longitude,
-                "altitude": root.altitude,
+                k: _ragged_to_padded(
+                    v.variable,
+                    current_ray_start_index,
+                    current_ray_n_gates,
+                    dims=("time", "range"),
+                    ngates=ngates,
+                )
+                for k, v in ds.data_vars.items()
+                if v.dims == ("n_points",)
             }
         )
 
-        sweep_groups.append(ds)
+    # handling first dimension
+    if first_dim == "auto":
+        if "time" in ds.dims:
+            ds = ds.swap_dims({"time": dim0})
+        ds = _sortby_dim(ds, dim0)
+    else:
+        if "time" not in ds.dims:
+            ds = ds.swap_dims({dim0: "time"})
+        ds = _sortby_dim(ds, "time")
+
+    # reassign azimuth/elevation coordinates
+    ds = ds.assign_coords({"azimuth": ds.azimuth})
+    ds = ds.assign_coords({"elevation": ds.elevation})
+
+    # assign geo-coords
+    ds = ds.assign_coords(
+        {
+            "latitude": root.latitude,
+            "longitude": root.longitude,
+            "altitude": root.altitude,
+        }
+    )
 
-    return sweep_groups
+    return ds
 
 
-def _assign_data_radial(root, sweep="sweep_0", first_dim="time"):
+def _assign_data_radial(root, sweep="sweep_0", first_dim="time", ragged=False):
     """Assign from CfRadial1 data structure.
 
     Parameters
@@ -165,16 +310,136 @@ def _assign_data_radial(root, sweep="sweep_0", first_dim="time"):
     sweep : int, optional
         Sweep number to extract, default to first sweep. If None, all sweeps are
         extracted into a list.
+    first_dim : str
+        Default to 'time' as first dimension. If set to 'auto', first dimension will
+        be either 'azimuth' or 'elevation' depending on type of sweep.
+    ragged : bool
+        Keep ragged moments of variable-gate files, defaults to False.
 
     Returns
     -------
     sweeps : list
         List of Sweep Datasets
     """
-    sweeps = _get_sweep_groups(root, sweep, first_dim=first_dim)
+    sweeps = _get_sweep_groups(root, sweep, first_dim=first_dim, ragged=ragged)
     return sweeps
 
 
+def _open_compressed_store(filename, format=None, max_memory=None, max_workers=None):
+    """Open gzip/bzip2 compressed CfRadial1 file as in-memory netCDF4 Dataset."""
+    import netCDF4
+
+    compression = _get_compression(filename)
+    image = _decompress_file(
+        filename, compression, max_memory=max_memory, max_workers=max_workers
+    )
+    kwargs = {"memory": image}
+    if format is not None:
+        kwargs["format"] = format
+    manager = CachingFileManager(
+        netCDF4.Dataset, os.fspath(filename), mode="r", kwargs=kwargs
+    )
+    return NetCDF4DataStore(manager, group=None)
+
+
+class CfRadial1SweepStore(AbstractDataStore):
+    """Store exposing only one sweep of a CfRadial1 file.
+
+    All variables are sliced along ``time``, ``sweep`` and ``n_points`` to the
+    hyperslab of the requested sweep, before any data is decoded. Ray indices are
+    rebased, so that the store represents a CfRadial1 file with a single sweep.
+
+    Parameters
+    ----------
+    store : xarray.backends.NetCDF4DataStore
+        Store of the complete CfRadial1 file.
+    sweep : int
+        Sweep index.
+    """
+
+    def __init__(self, store, sweep):
+        self._store = store
+        self._sweep = sweep
+        self._slices = None
+
+    @property
+    def slices(self):
+        if self._slices is None:
+            variables = self._store.get_variables()
+            nsweeps = variables["sweep_start_ray_index"].shape[0]
+            if not 0 <= self._sweep < nsweeps:
+                raise IndexError(
+                    f"xradar: sweep index `{self._sweep}` out of range for "
+                    f"file with {nsweeps} sweeps."
+                )
+            swslice = slice(self._sweep, self._sweep + 1)
+            start = int(variables["sweep_start_ray_index"][swslice].values[0])
+            end = int(variables["sweep_end_ray_index"][swslice].values[0])
+            tslice = slice(start, end + 1)
+            slices = {"sweep": swslice, "time": tslice}
+            if "ray_n_gates" in variables and "ray_start_index" in variables:
+                ray_n_gates = variables["ray_n_gates"][tslice].values
+                ray_start_index = variables["ray_start_index"][tslice].values
+                offset = int(ray_start_index[0])
+                slices["n_points"] = slice(
+                    offset, offset + int(ray_n_gates.astype(int).sum())
+                )
+            self._slices = slices
+        return self._slices
+
+    def get_variables(self):
+        slices = self.slices
+        variables = {}
+        for k, v in self._store.get_variables().items():
+            variables[k] = v.isel({d: sl for d, sl in slices.items() if d in v.dims})
+        # rebase ray indices to the extracted hyperslab
+        nrays = slices["time"].stop - slices["time"].start
+        for k, value in [
+            ("sweep_start_ray_index", 0),
+            ("sweep_end_ray_index", nrays - 1),
+        ]:
+            var = variables[k]
+            variables[k] = Variable(
+                var.dims, np.array([value], dtype=var.dtype), var.attrs, var.encoding
+            )
+        if "n_points" in slices:
+            var = variables["ray_start_index"]
+            variables["ray_start_index"] = Variable(
+                var.dims,
+                var.values - slices["n_points"].start,
+                var.attrs,
+                var.encoding,
+            )
+        return FrozenDict(variables)
+
+    def get_attrs(self):
+        return self._store.get_attrs()
+
+    def get_dimensions(self):
+        dims = dict(self._store.get_dimensions())
+        for d, sl in self.slices.items():
+            dims[d] = sl.stop - sl.start
+        return FrozenDict(dims)
+
+    def get_encoding(self):
+        return self._store.get_encoding()
+
+    def close(self):
+        self._store.close()
+
+
+_SWEEP_GROUP = re.compile(r"^sweep_(\d+)$")
+
+
+def _get_sweep_index(group):
+    """Get sweep index from group name, eg. 'sweep_8'."""
+    if isinstance(group, int):
+        return group
+    match = _SWEEP_GROUP.match(str(group))
+    return int(match.group(1)) if match else None
+
+
+@_cached
 def open_cfradial1_datatree(filename_or_obj, **kwargs):
     """Open CfRadial1 dataset as xradar Datatree.
 
@@ -192,6 +457,26 @@ def open_cfradial1_datatree(filename_or_obj, **kwargs):
     sweep : int, list of int, optional
         Sweep number(s) to extract, default to first sweep. If None, all sweeps are
         extracted into a list.
+    parallel : bool or str
+        Defaults to False, sweeps are created one after another. If True or "thread"
+        sweeps are created concurrently on a thread pool.
+    max_workers : int, optional
+        Maximum number of workers for ``parallel``.
+    ragged : bool
+        For files with variable number of gates (``ray_n_gates``) only. If True,
+        keep moments as flat ``n_points`` gate buffer together with per-ray
+        ``ray_start_index`` and ``ray_n_gates``. A padded (ray, range) view can be
+        created with ``ds.ragged.to_padded()``. Defaults to False.
+    elevation_range : tuple of float, optional
+        Only extract PPI sweeps with ``fixed_angle`` within (lo, hi), inclusive.
+    fixed_angles : float or list of float, optional
+        Only extract sweeps with given ``fixed_angle`` (elevation for PPI, azimuth
+        for RHI), with a tolerance of 0.05 deg.
+    load : {"lazy", "eager"}
+        Defaults to "lazy", data is read on access. If "eager", an in-memory
+        DataTree is returned and the file is closed. If all sweeps are wanted, all
+        variables are read in one pass, otherwise only the rays of the selected
+        sweeps.
     kwargs :  kwargs
         Additional kwargs are fed to `xr.open_dataset`.
 
@@ -202,16 +487,49 @@ def open_cfradial1_datatree(filename_or_obj, **kwargs):
     """
     # handle kwargs, extract first_dim
     first_dim = kwargs.get("first_dim", None)
+    ragged = kwargs.get("ragged", False)
     sweep = kwargs.pop("sweep", None)
-
-    # open root group, cfradial1 only has one group
-    ds = open_dataset(filename_or_obj, engine="cfradial1", **kwargs)
+    parallel = kwargs.pop("parallel", False)
+    max_workers = kwargs.pop("max_workers", None)
+    elevation_range = kwargs.pop("elevation_range", None)
+    fixed_angles = kwargs.pop("fixed_angles", None)
+    load = _get_load_mode(kwargs.pop("load", "lazy"))
+
+    # open root group, cfradial1 only has one group, the datatree is cached as a
+    # whole
+    with _uncached():
+        ds = open_dataset(filename_or_obj, engine="cfradial1", **kwargs)
+    if load == "eager":
+        selected = _get_sweep_indices(
+            ds,
+            sweep=sweep,
+            elevation_range=elevation_range,
+            fixed_angles=fixed_angles,
+        )
+        # all sweeps wanted, read all variables in one pass and slice from memory,
+        # otherwise only the ray hyperslabs of the selected sweeps are read below
+        if len(selected) == ds.dims["sweep"]:
+            ds = ds.load()
     # create datatree root node with required data
-    dtree = DataTree(data=_get_required_root_dataset(ds), name="root")
-    # return datatree with attached sweep child nodes
-    return _attach_sweep_groups(
-        dtree, _get_sweep_groups(ds, sweep=sweep, first_dim=first_dim)
+    root = _get_required_root_dataset(ds)
+    if load == "eager":
+        root = root.load()
+    dtree = DataTree(data=root, name="root")
+    sweeps = _get_sweep_groups(
+        ds,
+        sweep=sweep,
+        first_dim=first_dim,
+        parallel=parallel,
+        max_workers=max_workers,
+        elevation_range=elevation_range,
+        fixed_angles=fixed_angles,
+        ragged=ragged,
     )
+    if load == "eager":
+        sweeps = [swp.load() for swp in sweeps]
+        ds.close()
+    # return datatree with attached sweep child nodes
+    return _attach_sweep_groups(dtree, sweeps)
 
 
 class CfRadial1BackendEntrypoint(BackendEntrypoint):
@@ -222,10 +540,30 @@ class CfRadial1BackendEntrypoint(BackendEntrypoint):
     first_dim : str
         Default to 'time' as first dimension. If set to 'auto', first dimension will
         be either 'azimuth' or 'elevation' depending on type of sweep.
+    ragged : bool
+        For files with variable number of gates (``ray_n_gates``) only. If True,
+        keep moments as flat ``n_points`` gate buffer together with per-ray
+        ``ray_start_index`` and ``ray_n_gates``. A padded (ray, range) view can be
+        created with ``ds.ragged.to_padded()``. Defaults to False.
+    decode_dtype : str or numpy.dtype, optional
+        Floating dtype (eg. "float32") packed moments are decoded into directly,
+        instead of xarray's default choice. If "raw", moments are kept as packed
+        values with ``scale_factor``, ``add_offset`` and ``_FillValue`` attributes,
+        which are applied lazily with ``ds.packed.decode(dtype="float32")``
+        (``mask_undetect=True`` also masks ``_Undetect``). Defaults to None.
+    file_decompress_workers : int or bool, optional
+        Number of threads to decompress multi-member compressed files (BGZF,
+        pbzip2) in parallel (True: default pool size). Defaults to None, serial
+        decompression.
+    max_memory : int, optional
+        Gzip (``.gz``) and bzip2 (``.bz2``) compressed files are decompressed into an
+        in-memory netCDF4 image, no file is written. Maximum size of the image in
+        bytes, defaults to 1 GiB.
 
     Ported from wradlib.
     """
 
+    @_cached
     def open_dataset(
         self,
         filename_or_obj,
@@ -240,18 +578,56 @@ class CfRadial1BackendEntrypoint(BackendEntrypoint):
         format=None,
         group="/",
         first_dim="time",
+        ragged=False,
+        decode_dtype=None,
+        file_decompress_workers=None,
+        max_memory=None,
     ):
 
-        store = NetCDF4DataStore.open(
-            filename_or_obj,
-            format=format,
-            group=None,
-        )
+        if isinstance(filename_or_obj, AbstractDataStore):
+            # already opened store of the whole file, eg. a reference store
+            store = filename_or_obj
+        elif _get_compression(filename_or_obj) is not None:
+            store = _open_compressed_store(
+                filename_or_obj,
+                format=format,
+                max_memory=max_memory,
+                max_workers=file_decompress_workers,
+            )
+        else:
+            store = NetCDF4DataStore.open(
+                filename_or_obj,
+                format=format,
+                group=None,
+            )
+
+        # only expose the wanted sweep
+        if group != "/":
+            sweep = _get_sweep_index(group)
+            if sweep is None:
+                raise ValueError(
+                    f"Group `{group}` missing from file `{filename_or_obj}`."
+                )
+            store = CfRadial1SweepStore(store, sweep)
+            try:
+                store.slices
+            except IndexError:
+                raise ValueError(
+                    f"Group `{group}` missing from file `{filename_or_obj}`."
+                ) from None
+
+        # packed moments decoding policy
+        decode_dtype = _get_decode_dtype(decode_dtype)
+        decode_store = store
+        if decode_dtype == "raw":
+            mask_and_scale = False
+        elif decode_dtype is not None and mask_and_scale:
+            decode_store = _DecodeDtypeStore(store, decode_dtype)
 
         store_entrypoint = StoreBackendEntrypoint()
 
         ds = store_entrypoint.open_dataset(
-            store,
+            decode_store,
             mask_and_scale=mask_and_scale,
             decode_times=decode_times,
             concat_characters=concat_characters,
@@ -262,10 +638,7 @@ class CfRadial1BackendEntrypoint(BackendEntrypoint):
         )
 
         if group != "/":
-            ds = _assign_data_radial(ds, sweep=group, first_dim=first_dim)
-            if not ds:
-                raise ValueError(
-                    f"Group `{group}` missing from file `{filename_or_obj}`."
-                )
-            ds = ds[0]
+            ds = _assign_data_radial(ds, sweep=0, first_dim=first_dim, ragged=ragged)[0]
+            # dask chunks aligned with the compressed HDF5 chunks
+            ds = _assign_preferred_chunks(ds)
         return ds
@@ -12,9 +12,23 @@ Currently all private and not part of the public API.
 
 """
 
+import bz2
+import gzip
+import itertools
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
 import numpy as np
 import xarray as xr
 from datatree import DataTree
+from xarray.backends.common import AbstractDataStore, BackendArray
+from xarray.coding.variables import lazy_elemwise_func
+from xarray.core import dtypes, indexing
+from xarray.core.utils import FrozenDict
+from xarray.core.variable import Variable
 
 
 def _maybe_decode(attr):
@@ -24,101 +38,351 @@ def _maybe_decode(attr):
         return attr
 
 
-def _remove_duplicate_rays(ds, store=None):
-    dimname = list(ds.dims)[0]
-    # find exact duplicates and remove
-    _, idx = np.unique(ds[dimname], return_index=True)
-    if len(idx) < len(ds[dimname]):
-        ds = ds.isel({dimname: idx})
-        # if ray_time was erroneously created from wrong dimensions
-        # we need to recalculate it
-        if store and store._need_time_recalc:
-            ray_times = store._get_ray_times(nrays=len(idx))
-            # need to decode only if ds is decoded
-            if "units" in ds.rtime.encoding:
-                ray_times = xr.decode_cf(xr.Dataset({"rtime": ray_times})).rtime
-            ds = ds.assign({"rtime": ray_times})
-    return ds
+def _get_rotation(values):
+    """Get rotation of 1-D values into ascending order.
+
+    Returns 0 for already sorted values, the shift for a rotated ascending sequence
+    (eg. PPI starting at ``a1gate``) and None otherwise.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "fc" and np.isnan(values).any():
+        return None
+    if values.dtype.kind in "mM" and np.isnat(values).any():
+        return None
+    breaks = np.flatnonzero(values[1:] < values[:-1])
+    if not len(breaks):
+        return 0
+    # strict check keeps order of equal values identical to sortby
+    if len(breaks) == 1 and values[-1] < values[0]:
+        return int(breaks[0]) + 1
+    return None
+
+
+def _rotate_variable(var, dim, shift):
+    """Rotate variable along dim, ``shift`` becomes the first element."""
+    axis = var.get_axis_num(dim)
+    if var._in_memory or var.chunks is not None:
+        data = np.roll(var.data, -shift, axis=axis)
+    else:
+        data = indexing.LazilyIndexedArray(_RotatedArray(var, axis, shift))
+    return var.copy(deep=False, data=data)
+
+
+def _sortby_dim(ds, dim):
+    """Sort Dataset along dimension coordinate ``dim``.
+
+    Already sorted datasets are returned as is. Rotated datasets are rolled with
+    lazy contiguous slicing, only other datasets are sorted using ``sortby``.
+    """
+    shift = _get_rotation(ds[dim].values)
+    if shift is None:
+        return ds.sortby(dim)
+    if not shift:
+        return ds
+    rotated = {
+        k: _rotate_variable(v, dim, shift)
+        for k, v in ds.variables.items()
+        if dim in v.dims
+    }
+    coords = {k: v for k, v in rotated.items() if k in ds.coords}
+    data_vars = {k: v for k, v in rotated.items() if k not in ds.coords}
+    return ds.assign_coords(coords).assign(data_vars)
+
+
+def _get_angle_resolution(angles):
+    """Median positive difference of sorted unique angles, rounded to 0.01 deg."""
+    diff = np.diff(np.unique(angles[np.isfinite(angles)]))
+    diff = diff[diff > 0]
+    return float(np.round(np.median(diff), decimals=2)) if diff.size else None
+
+
+def _get_angle_grid(angles, res, full_range, circular=True, tol=0.4, sector=0.1):
+    """Snap rays to a regular angle grid.
+
+    The grid is aligned to the beam centers (mean phase of the angles relative to
+    ``res``). Full scans use the full grid, sectors (uncovered part larger than
+    ``sector`` of ``full_range``) only the covered part.
+
+    Parameters
+    ----------
+    angles : numpy.ndarray
+        Ray angles in acquisition order.
+    res : float
+        Angle resolution.
+    full_range : float
+        Angle range of a full scan (360 for PPI, 90 for RHI).
+    circular : bool
+        Angles wrap around at ``full_range`` (PPI).
+    tol : float
+        Rays farther away from any grid angle are dropped.
+    sector : float
+        Fraction of ``full_range`` a scan may miss to be treated as full scan.
+
+    Returns
+    -------
+    grid : numpy.ndarray
+        Grid angles.
+    index : numpy.ndarray
+        Gather index into ``angles`` for every grid angle, -1 for missing rays.
+    """
+    angles = np.asarray(angles, dtype=float)
+    nfull = int(np.round(full_range / res))
+    valid = np.isfinite(angles)
+    # grid offset from circular mean of beam center phases
+    phase = np.exp(2j * np.pi * angles[valid] / res)
+    # snapped to tenths of res to be robust against jitter
+    offset = res * ((np.round(10 * np.angle(phase.mean()) / (2 * np.pi)) / 10) % 1.0)
+    cell = np.rint((np.where(valid, angles, 0) - offset) / res).astype(int)
+    dist = np.abs(angles - (offset + cell * res))
+    if circular:
+        cell %= nfull
+    keep = np.flatnonzero(valid & (dist <= tol))
+
+    # keep nearest ray per grid cell (first ray on ties)
+    order = keep[np.lexsort((dist[keep], cell[keep]))]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cell[order][1:] != cell[order][:-1]
+    src = order[first]
+    cells = cell[src]
+
+    if not len(cells):
+        start, ncells = 0, 0
+    elif circular:
+        # largest circular gap between occupied cells marks sector boundaries
+        gaps = np.diff(np.append(cells, cells[0] + nfull)) - 1
+        j = int(np.argmax(gaps))
+        if gaps[j] > sector * nfull:
+            start, ncells = int(cells[(j + 1) % len(cells)]), nfull - int(gaps[j])
+        else:
+            start, ncells = 0, nfull
+    else:
+        lo, hi = int(cells[0]), int(cells[-1])
+        if lo >= 0 and hi < nfull and hi - lo + 1 >= (1 - sector) * nfull:
+            start, ncells = 0, nfull
+        else:
+            start, ncells = lo, hi - lo + 1
+
+    grid_cells = start + np.arange(ncells)
+    pos = cells - start
+    if circular:
+        grid_cells %= nfull
+        pos %= nfull
+    index = np.full(ncells, -1)
+    index[pos] = src
+    return offset + grid_cells * res, index
+
 
+class _GatherArray(BackendArray):
+    """Lazy view of a variable gathered along one axis.
 
-def _fix_angle(da):
-    # fix elevation outliers
-    if len(set(da.values)) > 1:
-        med = da.median(skipna=True)
-        da = da.where(da == med).fillna(med)
-    return da
+    Element ``i`` along ``axis`` is element ``index[i]`` of the source, negative
+    indices are filled with ``fill_value``. On access only the contiguous span of the
+    wanted source elements is read and gathered in one step.
 
+    Parameters
+    ----------
+    source : xarray.Variable
+        Source variable, eg. lazily loaded from file.
+    axis : int
+        Gathered axis.
+    index : numpy.ndarray
+        Gather index into ``source`` along ``axis``.
+    dtype : numpy.dtype
+        Output dtype.
+    fill_value : scalar
+        Value for negative indices.
+    """
 
-def _reindex_angle(ds, store=None, force=False, tol=None):
-    # Todo: The current code assumes to have PPI's of 360deg and RHI's of 90deg,
-    #       make this work also for sectorized (!!!) measurements
-    #       this needs refactoring, it's too complex
+    __slots__ = ("source", "axis", "index", "shape", "dtype", "fill_value")
+
+    def __init__(self, source, axis, index, dtype, fill_value):
+        self.source = source
+        self.axis = axis
+        self.index = np.asarray(index, dtype=int)
+        shape = list(source.shape)
+        shape[axis] = len(self.index)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.fill_value = fill_value
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._getitem
+        )
+
+    def _getitem(self, key):
+        key = tuple(key)
+        index = self.index[key[self.axis]]
+        idx = np.atleast_1d(index)
+        valid = idx >= 0
+        lo = idx[valid].min() if valid.any() else 0
+        hi = idx[valid].max() + 1 if valid.any() else 1
+        # read contiguous span of wanted elements only
+        skey = key[: self.axis] + (slice(lo, hi),) + key[self.axis + 1 :]
+        span = np.asarray(self.source[skey].values)
+        axis = self.axis - sum(
+            not isinstance(k, slice) and np.ndim(k) == 0 for k in key[: self.axis]
+        )
+        out = np.take(span, np.where(valid, idx - lo, 0), axis=axis)
+        out = out.astype(self.dtype, copy=False)
+        if not valid.all():
+            shape = [1] * out.ndim
+            shape[axis] = -1
+            out = np.where(valid.reshape(shape), out, self.fill_value)
+        if np.ndim(index) == 0:
+            out = out.squeeze(axis=axis)
+        return out
+
+
+def _gather_variable(var, dim, index):
+    """Gather variable along dim, negative indices are filled with missing values.
+
+    Packed integer data is filled with its ``_FillValue`` if available, otherwise the
+    dtype is promoted.
+    """
+    axis = var.get_axis_num(dim)
+    index = np.asarray(index, dtype=int)
+    missing = index < 0
+    dtype, fill_value = var.dtype, None
+    if missing.any():
+        fill_value = var.attrs.get("_FillValue", None)
+        if fill_value is None or np.issubdtype(dtype, np.floating):
+            dtype, fill_value = dtypes.maybe_promote(var.dtype)
+        else:
+            fill_value = np.asarray(fill_value).astype(dtype)
+    if var._in_memory or var.chunks is not None:
+        key = (slice(None),) * axis + (np.where(missing, 0, index),)
+        data = var.data[key].astype(dtype)
+        if fill_value is not None:
+            shape = [1] * var.ndim
+            shape[axis] = -1
+            data = np.where(missing.reshape(shape), fill_value, data)
+    else:
+        data = indexing.LazilyIndexedArray(
+            _GatherArray(var, axis, index, dtype, fill_value)
+        )
+    return Variable(var.dims, data, var.attrs, var.encoding)
+
+
+def _fix_secondary_angle(var):
+    """Replace non-uniform secondary angle (eg. PPI elevation) by its median."""
+    values = np.asarray(var.values)
+    if np.isnan(values).all() or (values == values.flat[0]).all():
+        return var
+    return var.copy(data=np.full_like(values, np.nanmedian(values)))
+
+
+def _regularize_angle(ds, store=None, tol=None, force=False, fix_secondary=False):
+    """Regularize sweep to a regular angle grid in one vectorized pass.
+
+    Rays are snapped to the nearest grid angle (within ``tol``), duplicate rays are
+    removed (nearest ray wins), missing rays are filled with missing values. Works
+    for full scans and sectors of PPI and RHI. The same gather index is applied to
+    all variables along the ray dimension.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Sweep with ray dimension (azimuth or elevation) as first dimension.
+    store : xarray.backends.AbstractDataStore, optional
+        Store (or its ``root`` metadata) providing ``angle_resolution`` and ray
+        times.
+    tol : bool or float, optional
+        Tolerance, defaults to 0.4 deg. If False, no regridding is done.
+    force : bool
+        Regrid also already regular sweeps.
+    fix_secondary : bool
+        Replace non-uniform secondary angle (PPI elevation, RHI azimuth) by its
+        median.
+
+    Returns
+    -------
+    ds : xarray.Dataset
+    """
+    dimname = list(ds.dims)[0]
+    secname = {"azimuth": "elevation", "elevation": "azimuth"}.get(dimname)
+    if fix_secondary and secname in ds.coords:
+        ds = ds.assign_coords({secname: _fix_secondary_angle(ds[secname].variable)})
+    if tol is False:
+        return ds
     if tol is True or tol is None:
         tol = 0.4
-    # disentangle different functionality
-    full_range = {"azimuth": 360, "elevation": 90}
-    dimname = list(ds.dims)[0]
-    # sort in any case, to prevent unsorted errors
-    ds = ds.sortby(dimname)
-    # fix angle range for rhi
-    if hasattr(ds, "elevation_upper_limit"):
-        ul = np.rint(ds.elevation_upper_limit)
-        full_range["elevation"] = ul
 
-    secname = {"azimuth": "elevation", "elevation": "azimuth"}.get(dimname)
-    dim = ds[dimname]
-    diff = dim.diff(dimname)
-    # this captures different angle spacing
-    # catches also missing rays and double rays
-    # and other erroneous ray alignments which result in different diff values
-    diffset = set(diff.values)
-    non_uniform_angle_spacing = len(diffset) > 1
-    # this captures missing and additional rays in case the angle differences
-    # are equal
-    non_full_circle = False
-    if not non_uniform_angle_spacing:
-        res = list(diffset)[0]
-        non_full_circle = ((res * ds.dims[dimname]) % full_range[dimname]) != 0
-
-    # fix issues with ray alignment
-    if force | non_uniform_angle_spacing | non_full_circle:
-        # create new array and reindex
-        if store and hasattr(store, "angle_resolution"):
-            res = store.angle_resolution
-        elif hasattr(ds[dimname], "angle_res"):
-            res = ds[dimname].angle_res
-        else:
-            res = diff.median(dimname).values
-        new_rays = int(np.round(full_range[dimname] / res, decimals=0))
-        # find exact duplicates and remove
-        ds = _remove_duplicate_rays(ds, store=store)
-
-        # do we have all needed rays?
-        if non_uniform_angle_spacing | len(ds[dimname]) != new_rays:
-            # todo: check if assumption that beam center points to
-            #       multiples of res/2. is correct in any case
-            # it might fail for cfradial1 data which already points to beam centers
-            azr = np.arange(res / 2.0, new_rays * res, res, dtype=diff.dtype)
-            fill_value = {
-                k: np.asarray(v._FillValue).astype(v.dtype)
-                for k, v in ds.items()
-                if hasattr(v, "_FillValue")
-            }
-            ds = ds.reindex(
-                {dimname: azr},
-                method="nearest",
-                tolerance=tol,
-                fill_value=fill_value,
+    # sweep metadata (eg. ODIM) is kept in the store's root
+    meta = getattr(store, "root", store)
+    angles = ds[dimname].values
+    if meta is not None and hasattr(meta, "angle_resolution"):
+        res = meta.angle_resolution
+    elif "angle_res" in ds[dimname].attrs:
+        res = ds[dimname].attrs["angle_res"]
+    else:
+        res = _get_angle_resolution(angles)
+    if res is None or not np.isfinite(res) or res <= 0:
+        return _sortby_dim(ds, dimname)
+
+    full_range = 360.0
+    if dimname == "elevation":
+        full_range = float(np.rint(getattr(ds, "elevation_upper_limit", 90.0)))
+    grid, index = _get_angle_grid(
+        angles, res, full_range, circular=dimname == "azimuth", tol=tol
+    )
+    nrays = len(angles)
+    complete = len(index) == nrays and (index >= 0).all()
+    if complete and not force and np.allclose(np.sort(angles), np.sort(grid)):
+        return _sortby_dim(ds, dimname)
+
+    if complete and np.array_equal(index, (np.arange(nrays) + index[0]) % nrays):
+        # pure rotation, keep contiguous reads
+        def regrid(v):
+            return _rotate_variable(v, dimname, int(index[0]))
+
+    else:
+
+        def regrid(v):
+            return _gather_variable(v, dimname, index)
+
+    variables = {
+        k: regrid(v) if dimname in v.dims else v for k, v in ds.variables.items()
+    }
+    angle = ds[dimname].variable
+    variables[dimname] = Variable(
+        (dimname,), grid.astype(angle.dtype), angle.attrs, angle.encoding
+    )
+
+    # secondary angle must not contain missing values
+    if secname in variables:
+        sec = variables[secname]
+        if np.isnan(sec.values).any() and not np.isnan(sec.values).all():
+            variables[secname] = sec.copy(
+                data=np.where(
+                    np.isnan(sec.values), np.nanmedian(sec.values), sec.values
+                )
             )
 
-        # check other coordinates
-        # check secondary angle coordinate (no nan)
-        # set nan values to reasonable median
-        if hasattr(ds, secname) and np.count_nonzero(np.isnan(ds[secname])):
-            ds[secname] = ds[secname].fillna(ds[secname].median(skipna=True))
-        # todo: rtime is also affected, might need to be treated accordingly
+    # ray times synthesized from sweep start/end are recalculated for the kept rays
+    valid = index >= 0
+    nkept = np.count_nonzero(valid)
+    recalc = getattr(meta, "_need_time_recalc", False)
+    if recalc and nkept < nrays and "time" in variables:
+        time = variables["time"]
+        ray_times = meta._get_ray_times(nrays=nkept)
+        if "units" in time.encoding:
+            ray_times = xr.decode_cf(
+                xr.Dataset(
+                    {"time": ("t", ray_times, {"units": time.encoding["units"]})}
+                )
+            ).time.values
+        values = time.values.copy()
+        values[valid] = ray_times
+        variables["time"] = time.copy(data=values)
 
-    return ds
+    out = xr.Dataset(
+        {k: variables[k] for k in ds.data_vars},
+        coords={k: variables[k] for k in ds.coords},
+        attrs=ds.attrs,
+    )
+    out.encoding = ds.encoding
+    return out
 
 
 def _attach_sweep_groups(dtree, sweeps):
@@ -126,3 +390,788 @@ def _attach_sweep_groups(dtree, sweeps):
     for i, sw in enumerate(sweeps):
         DataTree(sw, name=f"sweep_{i}", parent=dtree)
     return dtree
+
+
+def _select_sweeps_by_angle(
+    sweeps, elevation, fixed_angle, elevation_range=None, fixed_angles=None
+):
+    """Select sweeps by elevation range and/or fixed angles.
+
+    Parameters
+    ----------
+    sweeps : list
+        Sweep identifiers (eg. group names or sweep indices).
+    elevation : array-like
+        Elevation angle per sweep, nan for sweeps without fixed elevation (RHI).
+    fixed_angle : array-like
+        Fixed angle per sweep.
+    elevation_range : tuple of float, optional
+        Keep sweeps with elevation within (lo, hi), inclusive.
+    fixed_angles : float or list of float, optional
+        Keep sweeps with fixed angle matching any of the given angles within 0.05 deg.
+
+    Returns
+    -------
+    sweeps : list
+        Selected sweep identifiers in input order.
+    """
+    keep = np.ones(len(sweeps), dtype=bool)
+    if elevation_range is not None:
+        lo, hi = elevation_range
+        elevation = np.asarray(elevation, dtype=float)
+        keep &= (elevation >= lo) & (elevation <= hi)
+    if fixed_angles is not None:
+        fixed_angle = np.asarray(fixed_angle, dtype=float)
+        wanted = np.atleast_1d(np.asarray(fixed_angles, dtype=float))
+        keep &= np.isclose(fixed_angle[:, None], wanted[None, :], atol=0.05).any(axis=1)
+    return [swp for swp, k in zip(sweeps, keep) if k]
+
+
+def _get_token(filename, *args):
+    """Get deterministic dask token of file (with identity) and arguments."""
+    from dask.base import tokenize
+
+    identity = filename
+    if isinstance(filename, (str, os.PathLike)):
+        try:
+            stat = os.stat(filename)
+            identity = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+    return tokenize(identity, *args)
+
+
+def _read_ray_block(sources, dim, start, stop):
+    """Read block of rays of all source variables (dask task)."""
+    return tuple(src.isel({dim: slice(start, stop)}).values for src in sources)
+
+
+def _get_var_chunks(var, chunks):
+    """Get dask chunks (by dimension) of lazy variable.
+
+    Dimensions not given in ``chunks`` use the ``preferred_chunks`` encoding
+    (eg. the compressed HDF5 chunks) or are not chunked.
+    """
+    from dask.array.core import normalize_chunks
+
+    preferred = var.encoding.get("preferred_chunks", {})
+    if not isinstance(chunks, dict):
+        chunks = dict.fromkeys(var.dims, chunks)
+    previous = tuple(preferred.get(d, n) for d, n in zip(var.dims, var.shape))
+    wanted = tuple(chunks.get(d, None) or prev for d, prev in zip(var.dims, previous))
+    normalized = normalize_chunks(
+        wanted, shape=var.shape, dtype=var.dtype, previous_chunks=previous
+    )
+    return dict(zip(var.dims, normalized))
+
+
+def _get_block(block, index=None, key=None):
+    """Select variable ``index`` and sub-block ``key`` from ray block (dask task)."""
+    return block[index][key]
+
+
+def _coalesce_chunks(ds, chunks, token, read=_read_ray_block):
+    """Chunk lazily loaded variables of a sweep with one read task per ray chunk.
+
+    All lazy data variables along the ray dimension are read by a single task per
+    chunk of rays. The per-variable dask chunks are sliced from its result. In-memory
+    variables are kept as is.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Sweep Dataset with lazily loaded (not chunked) data variables.
+    chunks : int, dict or str
+        Chunks as given to :py:func:`xarray.open_dataset`.
+    token : str
+        Unique and deterministic token of the sweep.
+    read : callable
+        Read task ``read(sources, dim, start, stop)``, returns the ray block of
+        all source variables, defaults to reading them one after another.
+
+    Returns
+    -------
+    ds : xarray.Dataset
+    """
+    import dask.array as da
+    from dask.highlevelgraph import HighLevelGraph
+
+    lazy = {
+        k: v.variable
+        for k, v in ds.data_vars.items()
+        if v.ndim and not v.variable._in_memory
+    }
+    if not lazy:
+        return ds
+    dim = next(iter(lazy.values())).dims[0]
+    var_chunks = {k: _get_var_chunks(v, chunks) for k, v in lazy.items()}
+    ray_chunks = next(iter(var_chunks.values()))[dim]
+    coalesced = {
+        k: v
+        for k, v in lazy.items()
+        if v.dims[0] == dim and var_chunks[k][dim] == ray_chunks
+    }
+
+    read_name = f"xradar-read-{token}"
+    sources = partial(read, list(coalesced.values()))
+    bounds = np.cumsum((0,) + tuple(ray_chunks))
+    read_layer = {
+        (read_name, i): (sources, dim, int(bounds[i]), int(bounds[i + 1]))
+        for i in range(len(ray_chunks))
+    }
+
+    variables = {}
+    for index, (name, var) in enumerate(coalesced.items()):
+        vchunks = tuple(var_chunks[name][d] for d in var.dims)
+        # slices of every chunk along the non-ray dimensions
+        slices = [
+            [
+                slice(int(lo), int(hi))
+                for lo, hi in zip(np.cumsum((0,) + c), np.cumsum(c))
+            ]
+            for c in vchunks[1:]
+        ]
+        arr_name = f"xradar-{name}-{token}"
+        layer = {}
+        for i in range(len(ray_chunks)):
+            for blk in itertools.product(*[range(len(c)) for c in vchunks[1:]]):
+                key = (slice(None),) + tuple(sl[b] for sl, b in zip(slices, blk))
+                func = partial(_get_block, index=index, key=key)
+                layer[(arr_name, i) + blk] = (func, (read_name, i))
+        graph = HighLevelGraph(
+            {read_name: read_layer, arr_name: layer},
+            {read_name: set(), arr_name: {read_name}},
+        )
+        meta = np.empty((0,) * var.ndim, dtype=var.dtype)
+        data = da.Array(graph, arr_name, chunks=vchunks, dtype=var.dtype, meta=meta)
+        variables[name] = Variable(var.dims, data, var.attrs, var.encoding)
+
+    # other variables are chunked as usual
+    for name, var in lazy.items():
+        if name not in variables:
+            variables[name] = var.chunk(var_chunks[name])
+    return ds.assign(variables)
+
+
+def _get_load_mode(load):
+    """Check load mode of datatree functions, "lazy" or "eager"."""
+    if load not in ["lazy", "eager"]:
+        raise ValueError(
+            f"xradar: unknown load mode `{load}`, use one of 'lazy', 'eager'."
+        )
+    return load
+
+
+def _map_parallel(func, items, parallel=False, max_workers=None):
+    """Apply func to every item, optionally in parallel.
+
+    Parameters
+    ----------
+    func : callable
+        Function applied to every item. Needs to be picklable for
+        ``parallel="process"``.
+    items : list
+        Items, eg. file names.
+    parallel : bool or str
+        Defaults to False, items are processed one after another. If True or
+        "thread" a thread pool is used, if "process" a process pool is used.
+    max_workers : int, optional
+        Maximum number of workers, defaults to the executors default.
+
+    Returns
+    -------
+    results : list
+        Results in the order of input ``items``.
+    """
+    if parallel is False or parallel is None or len(items) < 2:
+        return [func(item) for item in items]
+    if parallel is True or parallel == "thread":
+        executor = ThreadPoolExecutor
+    elif parallel == "process":
+        executor = ProcessPoolExecutor
+    else:
+        raise ValueError(
+            f"xradar: unknown parallel mode `{parallel}`, "
+            "use one of True, False, 'thread', 'process'."
+        )
+    with executor(max_workers=max_workers) as ex:
+        return list(ex.map(func, items))
+
+
+def _map_sweeps(func, sweeps, parallel=False, max_workers=None):
+    """Apply func to every sweep, optionally in parallel.
+
+    Parameters
+    ----------
+    func : callable
+        Function creating the sweep Dataset from one item of ``sweeps``.
+    sweeps : list
+        Sweep identifiers (eg. group names or sweep indices).
+    parallel : bool or str
+        Defaults to False, sweeps are processed one after another. If True or
+        "thread" a thread pool is used. Process pools are not supported, the lazy
+        sweeps would be pickled back with their own store and every sweep would
+        reopen the file.
+    max_workers : int, optional
+        Maximum number of workers, defaults to the executors default.
+
+    Returns
+    -------
+    sweeps : list
+        Sweep Datasets in the order of input ``sweeps``.
+    """
+    if parallel == "process":
+        raise ValueError(
+            "xradar: parallel='process' is not supported for sweeps, "
+            "use one of True, False, 'thread'."
+        )
+    return _map_parallel(func, sweeps, parallel=parallel, max_workers=max_workers)
+
+
+def _get_preferred_chunks(var, aligned_dims=("range",)):
+    """Get sweep-aware preferred chunks of (ray, range) Variable.
+
+    Along ``aligned_dims`` the on-disk (HDF5) chunk layout is kept as is, so the
+    chunk sizes are taken from the ``chunksizes`` encoding. Ray dimensions
+    might be sliced, sorted or rolled when aligning the sweep, which breaks the
+    on-disk layout. Here the whole sweep extent is preferred, so every stored
+    chunk is decompressed only once by a single dask task.
+    """
+    chunksizes = var.encoding.get("chunksizes", None)
+    if chunksizes is not None and len(chunksizes) != var.ndim:
+        return None
+    preferred = {}
+    for axis, (dim, size) in enumerate(zip(var.dims, var.shape)):
+        if chunksizes is not None and dim in aligned_dims:
+            size = min(chunksizes[axis], size)
+        preferred[dim] = size
+    return preferred
+
+
+def _assign_preferred_chunks(ds, aligned_dims=("range",)):
+    """Add sweep-aware ``preferred_chunks`` to the encoding of sweep moments.
+
+    The encoding is used by xarray with ``chunks={}`` or ``chunks="auto"``.
+    """
+    for var in ds.data_vars.values():
+        if var.ndim < 2:
+            continue
+        preferred = _get_preferred_chunks(var.variable, aligned_dims=aligned_dims)
+        if preferred is not None:
+            var.encoding["preferred_chunks"] = preferred
+    return ds
+
+
+class _RaggedArray(BackendArray):
+    """Lazy padded (ray, gate) view of a flat ragged gate buffer.
+
+    Rays are given by their start index into the flat buffer and their number
+    of gates. On access only the contiguous span of the wanted rays is read and
+    gathered into the padded output in one vectorized step.
+
+    Parameters
+    ----------
+    source : xarray.Variable
+        1-D flat gate buffer, eg. lazily loaded from file.
+    start : numpy.ndarray
+        Start index of every ray into ``source``.
+    count : numpy.ndarray
+        Number of gates of every ray.
+    dtype : numpy.dtype
+        Output dtype.
+    fill_value : scalar or None
+        Value for gates beyond ``count``, None if no padding is needed.
+    """
+
+    __slots__ = ("source", "start", "count", "shape", "dtype", "fill_value")
+
+    def __init__(self, source, start, count, dtype, fill_value, ngates=None):
+        self.source = source
+        self.start = np.asarray(start, dtype=int)
+        self.count = np.asarray(count, dtype=int)
+        if ngates is None:
+            ngates = int(self.count.max()) if self.count.size else 0
+        self.shape = (len(self.start), ngates)
+        self.dtype = np.dtype(dtype)
+        self.fill_value = fill_value
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._getitem
+        )
+
+    def _getitem(self, key):
+        rkey, gkey = key
+        rays = np.arange(self.shape[0])[rkey]
+        gates = np.arange(self.shape[1])[gkey]
+        out_shape = np.shape(rays) + np.shape(gates)
+        rays = np.atleast_1d(rays)
+        gates = np.atleast_1d(gates)
+        start = self.start[rays]
+        count = self.count[rays]
+        out = np.empty((len(rays), len(gates)), dtype=self.dtype)
+        valid = gates[None, :] < count[:, None]
+        if self.fill_value is not None:
+            out[~valid] = self.fill_value
+        if np.any(valid):
+            # read contiguous span of wanted rays only
+            lo = start[count > 0].min()
+            hi = (start + count).max()
+            flat = np.asarray(self.source[lo:hi].values)
+            idx = (start - lo)[:, None] + gates[None, :]
+            out[valid] = flat[idx[valid]]
+        return out.reshape(out_shape)
+
+
+class _RotatedArray(BackendArray):
+    """Lazy rotated view of a variable along one axis.
+
+    Element ``i`` along ``axis`` is element ``(i + shift) % n`` of the source. Slices
+    are read as at most two contiguous slices of the source, no index arrays are
+    created.
+
+    Parameters
+    ----------
+    source : xarray.Variable
+        Source variable, eg. lazily loaded from file.
+    axis : int
+        Rotated axis.
+    shift : int
+        Index of the source element, which becomes the first element.
+    """
+
+    __slots__ = ("source", "axis", "shift", "shape", "dtype")
+
+    def __init__(self, source, axis, shift):
+        self.source = source
+        self.axis = axis
+        self.shift = shift
+        self.shape = source.shape
+        self.dtype = source.dtype
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._getitem
+        )
+
+    def _read(self, key, akey):
+        key = key[: self.axis] + (akey,) + key[self.axis + 1 :]
+        return np.asarray(self.source[key].values)
+
+    def _getitem(self, key):
+        key = tuple(key)
+        akey = key[self.axis]
+        size = self.shape[self.axis]
+        if isinstance(akey, slice) and akey.indices(size)[2] == 1:
+            start, stop, _ = akey.indices(size)
+            lo = start + self.shift
+            hi = lo + max(stop - start, 0)
+            parts = []
+            if lo < size:
+                parts.append(slice(lo, min(hi, size)))
+            if hi > size:
+                parts.append(slice(max(lo, size) - size, hi - size))
+            if len(parts) < 2:
+                return self._read(key, parts[0] if parts else slice(0, 0))
+            # output axis, integer keys before drop their axis
+            axis = self.axis - sum(
+                not isinstance(k, slice) and np.ndim(k) == 0 for k in key[: self.axis]
+            )
+            return np.concatenate([self._read(key, p) for p in parts], axis=axis)
+        idx = (np.arange(size)[akey] + self.shift) % size
+        return self._read(key, idx)
+
+
+def _ragged_to_padded(var, start, count, dims=("time", "range"), ngates=None):
+    """Convert 1-D ragged variable into padded 2-D variable.
+
+    Works lazily for file-backed and numpy data and with dask arrays.
+
+    Parameters
+    ----------
+    var : xarray.Variable
+        1-D flat gate buffer (eg. dimension ``n_points``).
+    start : array-like
+        Start index of every ray into ``var``.
+    count : array-like
+        Number of gates of every ray.
+    dims : tuple
+        Dimension names of the padded variable.
+    ngates : int, optional
+        Number of gates of the padded variable, defaults to ``max(count)``.
+
+    Returns
+    -------
+    var : xarray.Variable
+        Padded (ray, gate) variable. Gates beyond ``count`` are filled with
+        missing values (or ``_FillValue`` for packed data), integer data is
+        promoted only if padding is needed.
+    """
+    start = np.asarray(start, dtype=int)
+    count = np.asarray(count, dtype=int)
+    if ngates is None:
+        ngates = int(count.max()) if count.size else 0
+    dtype, fill_value = var.dtype, None
+    if np.any(count < ngates):
+        # keep packed integer data, if it can be padded with its _FillValue
+        fill_value = var.attrs.get("_FillValue", None)
+        if fill_value is None or np.issubdtype(dtype, np.floating):
+            dtype, fill_value = dtypes.maybe_promote(var.dtype)
+    if var.chunks is not None:
+        import dask.array as da
+
+        gates = np.arange(ngates)
+        valid = gates[None, :] < count[:, None]
+        idx = np.where(valid, start[:, None] + gates[None, :], 0)
+        data = var.data.astype(dtype).vindex[idx]
+        if fill_value is not None:
+            data = da.where(valid, data, fill_value)
+    else:
+        data = indexing.LazilyIndexedArray(
+            _RaggedArray(var, start, count, dtype, fill_value, ngates=ngates)
+        )
+    return Variable(dims, data, var.attrs, var.encoding)
+
+
+def _ragged_dataset_to_padded(ds):
+    """Materialize padded (ray, range) moments of ragged sweep Dataset.
+
+    Moments with dimension ``n_points`` are converted using the per-ray
+    ``ray_start_index`` and ``ray_n_gates``, which are dropped afterwards.
+    """
+    if "ray_n_gates" not in ds:
+        return ds
+    start = ds.ray_start_index.values
+    count = ds.ray_n_gates.values
+    dims = (ds.ray_n_gates.dims[0], "range")
+    ngates = ds.dims.get("range", None)
+    padded = {
+        k: _ragged_to_padded(v.variable, start, count, dims=dims, ngates=ngates)
+        for k, v in ds.data_vars.items()
+        if v.dims == ("n_points",)
+    }
+    ds = ds.drop_vars(list(padded) + ["ray_start_index", "ray_n_gates"])
+    return ds.assign(padded)
+
+
+def _get_decode_dtype(decode_dtype):
+    """Check decode_dtype, return None, "raw" or floating numpy dtype."""
+    if decode_dtype is None or decode_dtype == "raw":
+        return decode_dtype
+    dtype = np.dtype(decode_dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError(
+            f"xradar: decode_dtype needs to be a floating dtype or 'raw', "
+            f"got `{decode_dtype}`."
+        )
+    return dtype
+
+
+def _mask_and_scale(data, fill_values, scale_factor, add_offset, dtype, view=None):
+    raw = np.asarray(data)
+    if view is not None:
+        # reinterpret _Unsigned data before scaling
+        raw = raw.view(view)
+    data = np.array(raw, dtype=dtype, copy=True)
+    if scale_factor is not None:
+        data *= scale_factor
+    if add_offset is not None:
+        data += add_offset
+    if fill_values:
+        data[np.isin(raw, fill_values)] = np.nan
+    return data
+
+
+def _get_unsigned_view(dtype, unsigned):
+    """Get integer dtype data needs to be viewed as for ``_Unsigned``, or None."""
+    dtype = np.dtype(dtype)
+    unsigned = _maybe_decode(unsigned)
+    if dtype.kind == "i" and str(unsigned).lower() == "true":
+        return np.dtype(f"u{dtype.itemsize}")
+    if dtype.kind == "u" and str(unsigned).lower() == "false":
+        return np.dtype(f"i{dtype.itemsize}")
+    return None
+
+
+def _is_packed(var):
+    """Return True for packed moments (``scale_factor`` or ``add_offset``)."""
+    return "scale_factor" in var.attrs or "add_offset" in var.attrs
+
+
+def _decode_moment(var, dtype, mask_undetect=False):
+    """Lazily mask and scale packed moment variable directly into dtype.
+
+    ``scale_factor``, ``add_offset``, ``_FillValue``, ``missing_value`` and
+    ``_Unsigned`` are moved to encoding, so they are not applied a second time by
+    xarray. ``_Undetect`` values are masked too if ``mask_undetect`` is True.
+    """
+    attrs = dict(var.attrs)
+    encoding = dict(var.encoding)
+    unsigned = attrs.pop("_Unsigned", None)
+    view = None
+    if unsigned is not None:
+        encoding["_Unsigned"] = unsigned
+        view = _get_unsigned_view(var.dtype, unsigned)
+    keys = ["_FillValue", "missing_value"]
+    if mask_undetect:
+        keys.append("_Undetect")
+    fill_values = []
+    for key in keys:
+        value = attrs.pop(key, None)
+        if value is not None:
+            encoding[key] = value
+            value = np.ravel(value)
+            if view is not None and value.dtype.kind in "iu":
+                value = value.astype(var.dtype).view(view)
+            fill_values.extend([fv for fv in value if not np.isnan(np.float64(fv))])
+    scale_factor = attrs.pop("scale_factor", None)
+    add_offset = attrs.pop("add_offset", None)
+    for key, value in [("scale_factor", scale_factor), ("add_offset", add_offset)]:
+        if value is not None:
+            encoding[key] = value
+    transform = partial(
+        _mask_and_scale,
+        fill_values=fill_values,
+        scale_factor=scale_factor,
+        add_offset=add_offset,
+        dtype=dtype,
+        view=view,
+    )
+    data = lazy_elemwise_func(var._data, transform, dtype)
+    # dask arrays are decoded blockwise by lazy_elemwise_func
+    if var.chunks is None:
+        data = indexing.LazilyIndexedArray(data)
+    return Variable(var.dims, data, attrs, encoding)
+
+
+def _decode_packed(ds, dtype="float32", mask_undetect=False):
+    """Lazily decode packed moments of a Dataset into floating dtype.
+
+    Meant for Datasets opened with ``decode_dtype="raw"``, where moments are kept
+    as packed integers. Scale/offset, ``_Unsigned`` and ``_FillValue`` (and
+    optionally ``_Undetect``) are applied on access, dask arrays stay dask arrays.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with packed moments.
+    dtype : str or numpy.dtype
+        Floating dtype, defaults to "float32".
+    mask_undetect : bool
+        If True, ``_Undetect`` values are masked (NaN) too. Defaults to False.
+
+    Returns
+    -------
+    ds : xarray.Dataset
+    """
+    dtype = _get_decode_dtype(dtype)
+    if not isinstance(dtype, np.dtype):
+        raise ValueError(f"xradar: dtype needs to be a floating dtype, got `{dtype}`.")
+    return ds.assign(
+        {
+            k: _decode_moment(v.variable, dtype, mask_undetect=mask_undetect)
+            for k, v in ds.data_vars.items()
+            if _is_packed(v)
+        }
+    )
+
+
+class _DecodeDtypeStore(AbstractDataStore):
+    """Store wrapper decoding packed moments into wanted floating dtype.
+
+    Packed moments are variables with ``scale_factor`` or ``add_offset``
+    attributes. They are decoded lazily directly into ``dtype`` without creating
+    float64 intermediates. All other variables are passed as is.
+    """
+
+    def __init__(self, store, dtype):
+        self._store = store
+        self._dtype = dtype
+
+    def get_variables(self):
+        return FrozenDict(
+            (k, _decode_moment(v, self._dtype)) if _is_packed(v) else (k, v)
+            for k, v in self._store.get_variables().items()
+        )
+
+    def get_attrs(self):
+        return self._store.get_attrs()
+
+    def get_dimensions(self):
+        return self._store.get_dimensions()
+
+    def get_encoding(self):
+        return self._store.get_encoding()
+
+    def close(self):
+        self._store.close()
+
+
+#: default memory budget (bytes) for the in-memory image of compressed files
+DECOMPRESS_MAX_MEMORY = 2**30
+
+_COMPRESSION_SUFFIX = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2"}
+_COMPRESSION_MAGIC = {"gzip": b"\x1f\x8b", "bz2": b"BZh"}
+_BZ2_STREAM = re.compile(rb"BZh[1-9]1AY&SY")
+
+
+def _get_compression(filename):
+    """Get compression ("gzip" or "bz2") of local file from suffix and magic bytes.
+
+    Returns None for uncompressed files and non-path objects.
+    """
+    if not isinstance(filename, (str, os.PathLike)):
+        return None
+    suffix = os.path.splitext(os.fspath(filename))[1].lower()
+    compression = _COMPRESSION_SUFFIX.get(suffix, None)
+    if compression is None or not os.path.isfile(filename):
+        return None
+    with open(filename, "rb") as f:
+        magic = f.read(3)
+    if not magic.startswith(_COMPRESSION_MAGIC[compression]):
+        return None
+    return compression
+
+
+def _get_bgzf_members(data):
+    """Get (start, stop, size) of BGZF blocks (gzip members with known size).
+
+    Returns None if data is not completely made of BGZF blocks.
+    """
+    members = []
+    pos = 0
+    while pos < len(data):
+        # gzip header with FEXTRA flag
+        if bytes(data[pos : pos + 4]) != b"\x1f\x8b\x08\x04":
+            return None
+        xlen = int.from_bytes(data[pos + 10 : pos + 12], "little")
+        extra = bytes(data[pos + 12 : pos + 12 + xlen])
+        i, bsize = 0, None
+        while i + 4 <= xlen:
+            slen = int.from_bytes(extra[i + 2 : i + 4], "little")
+            if extra[i : i + 2] == b"BC" and slen == 2:
+                bsize = int.from_bytes(extra[i + 4 : i + 6], "little") + 1
+            i += 4 + slen
+        # truncated block
+        if bsize is None or pos + bsize > len(data):
+            return None
+        isize = int.from_bytes(data[pos + bsize - 4 : pos + bsize], "little")
+        members.append((pos, pos + bsize, isize))
+        pos += bsize
+    return members
+
+
+def _get_bz2_members(data):
+    """Get (start, stop, None) of candidate streams of multi-stream bzip2 data.
+
+    Candidates are validated on decompression.
+    """
+    starts = [m.start() for m in _BZ2_STREAM.finditer(data)]
+    if len(starts) < 2 or starts[0] != 0:
+        return None
+    return [(lo, hi, None) for lo, hi in zip(starts, starts[1:] + [len(data)])]
+
+
+def _decompress_gzip_member(data):
+    return zlib.decompress(data, wbits=31)
+
+
+def _decompress_bz2_member(data):
+    dec = bz2.BZ2Decompressor()
+    try:
+        out = dec.decompress(data)
+    except OSError:
+        return None
+    # no valid stream boundary
+    if not dec.eof or dec.unused_data:
+        return None
+    return out
+
+
+def _check_memory(nbytes, max_memory, filename):
+    if nbytes > max_memory:
+        raise ValueError(
+            f"xradar: decompressed `{filename}` exceeds memory budget of "
+            f"{max_memory} bytes, increase `max_memory`."
+        )
+
+
+def _decompress_members(data, members, compression, max_memory, max_workers, name):
+    """Decompress independent members concurrently in batches.
+
+    Returns None if a member turns out to be invalid.
+    """
+    func = {"gzip": _decompress_gzip_member, "bz2": _decompress_bz2_member}
+    func = func[compression]
+    sizes = [size for _, _, size in members]
+    if None not in sizes:
+        _check_memory(sum(sizes), max_memory, name)
+    view = memoryview(data)
+    out, nbytes = [], 0
+    # bounded number of members in flight
+    batch = 4 * (max_workers or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        for i in range(0, len(members), batch):
+            blocks = [view[lo:hi] for lo, hi, _ in members[i : i + batch]]
+            for chunk in ex.map(func, blocks):
+                if chunk is None:
+                    return None
+                nbytes += len(chunk)
+                _check_memory(nbytes, max_memory, name)
+                out.append(chunk)
+    return b"".join(out)
+
+
+def _decompress_file(filename, compression, max_memory=None, max_workers=None):
+    """Decompress gzip or bzip2 compressed file into memory.
+
+    Multi-member files (BGZF, multi-stream bzip2 as written by pbzip2) are
+    decompressed member-wise on a thread pool, if ``max_workers`` is given. Other
+    files are decompressed in one streaming pass.
+
+    Parameters
+    ----------
+    filename : str or os.PathLike
+        Compressed file.
+    compression : {"gzip", "bz2"}
+        Compression of the file.
+    max_memory : int, optional
+        Maximum size of the decompressed image in bytes, defaults to
+        :py:data:`DECOMPRESS_MAX_MEMORY`.
+    max_workers : int or bool, optional
+        Number of threads for parallel decompression (True: default pool size),
+        defaults to None, serial decompression.
+
+    Returns
+    -------
+    image : bytes
+        Decompressed file image.
+    """
+    if max_memory is None:
+        max_memory = DECOMPRESS_MAX_MEMORY
+    if max_workers is not None and max_workers is not False:
+        if max_workers is True:
+            max_workers = os.cpu_count()
+        with open(filename, "rb") as f:
+            data = f.read()
+        get_members = {"gzip": _get_bgzf_members, "bz2": _get_bz2_members}
+        members = get_members[compression](data)
+        if members is not None and len(members) > 1:
+            image = _decompress_members(
+                data, members, compression, max_memory, max_workers, filename
+            )
+            if image is not None:
+                return image
+        del data
+
+    opener = {"gzip": gzip.open, "bz2": bz2.open}[compression]
+    out, nbytes = [], 0
+    with opener(filename, "rb") as f:
+        while True:
+            chunk = f.read(2**24)
+            if not chunk:
+                break
+            nbytes += len(chunk)
+            _check_memory(nbytes, max_memory, filename)
+            out.append(chunk)
+    return b"".join(out)
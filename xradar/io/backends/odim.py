@@ -34,8 +34,15 @@ __doc__ = __doc__.format("\n   ".join(__all__))
 
 import datetime as dt
 import io
+import itertools
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, partial
 
 import h5netcdf
+import h5py
 import numpy as np
 import xarray as xr
 from datatree import DataTree
@@ -60,16 +67,97 @@ from ...model import (
     get_latitude_attrs,
     get_longitude_attrs,
     get_range_attrs,
-    get_time_attrs,
     moment_attrs,
     sweep_vars_mapping,
 )
-from ...util import has_import
-from .common import _attach_sweep_groups, _fix_angle, _maybe_decode, _reindex_angle
+from ..cache import _cached
+from .common import (
+    _assign_preferred_chunks,
+    _attach_sweep_groups,
+    _coalesce_chunks,
+    _DecodeDtypeStore,
+    _decompress_file,
+    _get_compression,
+    _get_decode_dtype,
+    _get_load_mode,
+    _get_token,
+    _map_sweeps,
+    _maybe_decode,
+    _regularize_angle,
+    _select_sweeps_by_angle,
+    _sortby_dim,
+)
 
 HDF5_LOCK = SerializableLock()
 
 
+class _FileImage:
+    """Holder of an in-memory HDF5 file image (bytes-like).
+
+    Hashed by identity, so the file manager doesn't hash the whole buffer, and
+    picklable also for memoryview buffers.
+    """
+
+    __slots__ = ("buffer",)
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __reduce__(self):
+        return type(self), (bytes(self.buffer),)
+
+
+class _H5NetCDFFileImage(h5netcdf.File):
+    """h5netcdf.File backed by an in-memory HDF5 file image, no file is written."""
+
+    def __init__(self, image, mode="r", **kwargs):
+        if mode != "r":
+            raise ValueError("xradar: HDF5 file images can only be opened read-only.")
+        self._image = h5py.File(h5py.h5f.open_file_image(image.buffer), "r")
+        super().__init__(self._image, mode=mode, **kwargs)
+
+    def close(self):
+        super().close()
+        self._image.close()
+
+
+def _get_odim_lock(lock, filename):
+    """Get lock for ODIM_H5 file access.
+
+    Parameters
+    ----------
+    lock : bool, str or Lock-like, optional
+        None, True or "file" (default): one lock per file, reads of different files
+        do not block each other. "global": one lock for all files
+        (:py:data:`HDF5_LOCK`). False or "process": no locking, for thread-safe
+        h5py builds or if every process (eg. process pools, dask workers with
+        one thread) opens its own file handle. Any other object is used as lock.
+    filename : str, os.PathLike or file-like
+        Source of the store.
+
+    Returns
+    -------
+    lock : Lock-like or False
+    """
+    if lock is None or lock is True or lock == "file":
+        if isinstance(filename, (str, os.PathLike)):
+            # same token for the same file, also after unpickling
+            token = f"xradar-odim-{os.path.abspath(filename)}"
+            return SerializableLock(token=token)
+        # file-like objects, one lock per object
+        return SerializableLock()
+    if lock is False or lock == "process":
+        return False
+    if lock == "global":
+        return HDF5_LOCK
+    if isinstance(lock, str):
+        raise ValueError(
+            f"Unknown lock `{lock}`, use one of 'file', 'global', 'process', "
+            "False or a Lock-like object."
+        )
+    return lock
+
+
 def _calculate_angle_res(dim):
     # need to sort dim first
     angle_diff = np.diff(sorted(dim))
@@ -82,8 +170,58 @@ def _calculate_angle_res(dim):
     return np.round(np.nanmean(angle_diff_wanted), decimals=2)
 
 
+def _get_group_attrs(group, name):
+    """Read all attributes of subgroup `name` in one pass."""
+    try:
+        return dict(group[name].attrs)
+    except KeyError:
+        return {}
+
+
+def _get_fixed_dim_and_angle(where):
+    """Get first dimension and fixed angle from dataset ``where`` attributes."""
+    dim = "elevation"
+
+    # try RHI first
+    angle_keys = ["az_angle", "azangle"]
+    angle = None
+    for ak in angle_keys:
+        angle = where.get(ak, None)
+        if angle is not None:
+            break
+    if angle is None:
+        dim = "azimuth"
+        angle = where["elangle"]
+
+    angle = np.round(angle, decimals=1)
+    return dim, angle
+
+
+def _get_dset_what(fileobj, group):
+    """Get moment metadata from ``what`` attributes of given dataN/qualityN group."""
+    attrs = {}
+    what = fileobj[group]["what"].attrs
+    attrs["scale_factor"] = what.get("gain", 1)
+    attrs["add_offset"] = what.get("offset", 0)
+    attrs["_FillValue"] = what.get("nodata", None)
+    attrs["_Undetect"] = what.get("undetect", 0)
+    # if no quantity is given, use the group-name
+    attrs["quantity"] = _maybe_decode(what.get("quantity", group.split("/")[-1]))
+    return attrs
+
+
+def _get_dset_quantity(fileobj, group):
+    """Get moment name of given dataN/qualityN group, reading only ``quantity``."""
+    what = fileobj[group]["what"].attrs
+    return _maybe_decode(what.get("quantity", group.split("/")[-1]))
+
+
 class _OdimH5NetCDFMetadata:
-    """Wrapper around OdimH5 data fileobj for easy access of metadata.
+    """Snapshot of OdimH5 sweep metadata for easy access.
+
+    All ``how``, ``what`` and ``where`` attributes of the dataset group and the
+    ``where`` attributes of the root group are read in one pass on instantiation.
+    Derived coordinate arrays are calculated only once.
 
     Parameters
     ----------
@@ -98,12 +236,16 @@ class _OdimH5NetCDFMetadata:
     """
 
     def __init__(self, fileobj, group):
-        self._root = fileobj
         self._group = group
+        grp = fileobj[group.split("/")[0]]
+        self._how = _get_group_attrs(grp, "how")
+        self._what = _get_group_attrs(grp, "what")
+        self._where = _get_group_attrs(grp, "where")
+        self._root_where = _get_group_attrs(fileobj, "where")
 
     @property
     def first_dim(self):
-        dim, _ = self._get_fixed_dim_and_angle()
+        dim, _ = self.fixed_dim_and_angle
         return dim
 
     def get_variable_dimensions(self, dims):
@@ -124,7 +266,7 @@ class _OdimH5NetCDFMetadata:
         a1gate = self.a1gate
         rtime = self.ray_times
         dim, angle = self.fixed_dim_and_angle
-        angle_res = _calculate_angle_res(locals()[dim])
+        angle_res = self.angle_resolution
         dims = ("azimuth", "elevation")
         if dim == dims[1]:
             dims = (dims[1], dims[0])
@@ -155,8 +297,6 @@ class _OdimH5NetCDFMetadata:
         lat_attrs = get_latitude_attrs()
         alt_attrs = get_altitude_attrs()
 
-        time_attrs = get_time_attrs("1970-01-01T00:00:00Z")
-
         lon, lat, alt = self.site_coords
 
         # todo: add CF attributes where not yet available
@@ -165,7 +305,6 @@ class _OdimH5NetCDFMetadata:
             "elevation": Variable((dims[0],), elevation, el_attrs),
             "time": Variable((dims[0],), rtime, rtime_attrs),
             "range": Variable(("range",), range_data, range_attrs),
-            # "time": Variable((), self.time, time_attrs),
             "sweep_mode": Variable((), sweep_mode),
             "sweep_number": Variable((), sweep_number),
             "prt_mode": Variable((), prt_mode),
@@ -177,29 +316,29 @@ class _OdimH5NetCDFMetadata:
         }
         return coordinates
 
-    @property
+    @cached_property
+    def angle_resolution(self):
+        dim, _ = self.fixed_dim_and_angle
+        return _calculate_angle_res(getattr(self, dim))
+
+    @cached_property
     def site_coords(self):
         return self._get_site_coords()
 
-    @property
+    @cached_property
     def time(self):
         return self._get_time()
 
-    @property
+    @cached_property
     def fixed_dim_and_angle(self):
         return self._get_fixed_dim_and_angle()
 
-    @property
+    @cached_property
     def range(self):
         return self._get_range()
 
-    @property
-    def what(self):
-        return self._get_dset_what()
-
     def _get_azimuth_how(self):
-        grp = self._group.split("/")[0]
-        how = self._root[grp]["how"].attrs
+        how = self._how
         startaz = how["startazA"]
         stopaz = how.get("stopazA", False)
         if stopaz is False:
@@ -207,6 +346,9 @@ class _OdimH5NetCDFMetadata:
             # create from startazA
             stopaz = np.roll(startaz, -1)
             stopaz[-1] += 360
+        else:
+            # do not alter the metadata snapshot
+            stopaz = stopaz.copy()
         zero_index = np.where(stopaz < startaz)
         stopaz[zero_index[0]] += 360
         azimuth_data = (startaz + stopaz) / 2.0
@@ -214,33 +356,16 @@ class _OdimH5NetCDFMetadata:
         return azimuth_data
 
     def _get_azimuth_where(self):
-        grp = self._group.split("/")[0]
-        nrays = self._root[grp]["where"].attrs["nrays"]
+        nrays = self._where["nrays"]
         res = 360.0 / nrays
         azimuth_data = np.arange(res / 2.0, 360.0, res, dtype="float32")
         return azimuth_data
 
     def _get_fixed_dim_and_angle(self):
-        grp = self._group.split("/")[0]
-        dim = "elevation"
-
-        # try RHI first
-        angle_keys = ["az_angle", "azangle"]
-        angle = None
-        for ak in angle_keys:
-            angle = self._root[grp]["where"].attrs.get(ak, None)
-            if angle is not None:
-                break
-        if angle is None:
-            dim = "azimuth"
-            angle = self._root[grp]["where"].attrs["elangle"]
-
-        angle = np.round(angle, decimals=1)
-        return dim, angle
+        return _get_fixed_dim_and_angle(self._where)
 
     def _get_elevation_how(self):
-        grp = self._group.split("/")[0]
-        how = self._root[grp]["how"].attrs
+        how = self._how
         startaz = how.get("startelA", False)
         stopaz = how.get("stopelA", False)
         if startaz is not False and stopaz is not False:
@@ -250,22 +375,19 @@ class _OdimH5NetCDFMetadata:
         return elevation_data
 
     def _get_elevation_where(self):
-        grp = self._group.split("/")[0]
-        nrays = self._root[grp]["where"].attrs["nrays"]
-        elangle = self._root[grp]["where"].attrs["elangle"]
+        nrays = self._where["nrays"]
+        elangle = self._where["elangle"]
         elevation_data = np.ones(nrays, dtype="float32") * elangle
         return elevation_data
 
     def _get_time_how(self):
-        grp = self._group.split("/")[0]
-        startT = self._root[grp]["how"].attrs["startazT"]
-        stopT = self._root[grp]["how"].attrs["stopazT"]
+        startT = self._how["startazT"]
+        stopT = self._how["stopazT"]
         time_data = (startT + stopT) / 2.0
         return time_data
 
     def _get_time_what(self, nrays=None):
-        grp = self._group.split("/")[0]
-        what = self._root[grp]["what"].attrs
+        what = self._what
         startdate = _maybe_decode(what["startdate"])
         starttime = _maybe_decode(what["starttime"])
         # take care for missing enddate/endtime
@@ -277,7 +399,7 @@ class _OdimH5NetCDFMetadata:
         start = start.replace(tzinfo=dt.timezone.utc).timestamp()
         end = end.replace(tzinfo=dt.timezone.utc).timestamp()
         if nrays is None:
-            nrays = self._root[grp]["where"].attrs["nrays"]
+            nrays = self._where["nrays"]
         if start == end:
             import warnings
 
@@ -305,8 +427,7 @@ class _OdimH5NetCDFMetadata:
         return time_data
 
     def _get_range(self):
-        grp = self._group.split("/")[0]
-        where = self._root[grp]["where"].attrs
+        where = self._where
         ngates = where["nbins"]
         range_start = where["rstart"] * 1000.0
         bin_range = where["rscale"]
@@ -317,43 +438,30 @@ class _OdimH5NetCDFMetadata:
         return range_data, cent_first, bin_range
 
     def _get_time(self, point="start"):
-        grp = self._group.split("/")[0]
-        what = self._root[grp]["what"].attrs
-        startdate = _maybe_decode(what[f"{point}date"])
-        starttime = _maybe_decode(what[f"{point}time"])
+        what = self._what
+        # take care for missing enddate/endtime
+        # see https://github.com/wradlib/wradlib/issues/563
+        startdate = _maybe_decode(what.get(f"{point}date", what["startdate"]))
+        starttime = _maybe_decode(what.get(f"{point}time", what["starttime"]))
         start = dt.datetime.strptime(startdate + starttime, "%Y%m%d%H%M%S")
         start = start.replace(tzinfo=dt.timezone.utc).timestamp()
         return start
 
     def _get_a1gate(self):
-        grp = self._group.split("/")[0]
-        a1gate = self._root[grp]["where"].attrs["a1gate"]
+        a1gate = self._where["a1gate"]
         return a1gate
 
     def _get_site_coords(self):
-        lon = self._root["where"].attrs["lon"]
-        lat = self._root["where"].attrs["lat"]
-        alt = self._root["where"].attrs["height"]
+        lon = self._root_where["lon"]
+        lat = self._root_where["lat"]
+        alt = self._root_where["height"]
         return lon, lat, alt
 
-    def _get_dset_what(self):
-        attrs = {}
-        what = self._root[self._group]["what"].attrs
-        attrs["scale_factor"] = what.get("gain", 1)
-        attrs["add_offset"] = what.get("offset", 0)
-        attrs["_FillValue"] = what.get("nodata", None)
-        attrs["_Undetect"] = what.get("undetect", 0)
-        # if no quantity is given, use the group-name
-        attrs["quantity"] = _maybe_decode(
-            what.get("quantity", self._group.split("/")[-1])
-        )
-        return attrs
-
-    @property
+    @cached_property
     def a1gate(self):
         return self._get_a1gate()
 
-    @property
+    @cached_property
     def azimuth(self):
         try:
             azimuth = self._get_azimuth_how()
@@ -361,7 +469,7 @@ class _OdimH5NetCDFMetadata:
             azimuth = self._get_azimuth_where()
         return azimuth
 
-    @property
+    @cached_property
     def elevation(self):
         try:
             elevation = self._get_elevation_how()
@@ -369,18 +477,233 @@ class _OdimH5NetCDFMetadata:
             elevation = self._get_elevation_where()
         return elevation
 
-    @property
+    @cached_property
     def ray_times(self):
         return self._get_ray_times()
 
 
+def _get_chunk_selection(shape, key):
+    """Get bounding hyperslab (start, stop) of outer indexing key.
+
+    Returns start, stop and the remaining key to apply to the hyperslab, or
+    None for strided slices.
+    """
+    starts, stops, subkey = [], [], []
+    for k, size in zip(key, shape):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(size)
+            if step != 1:
+                return None
+            stop = max(start, stop)
+            k = slice(None)
+        elif isinstance(k, (int, np.integer)):
+            start = int(k) + size if k < 0 else int(k)
+            stop = start + 1
+            k = 0
+        else:
+            # integer array, eg. sorted rays
+            k = np.asarray(k) % size
+            if not k.size:
+                return None
+            start, stop = int(k.min()), int(k.max()) + 1
+            k = k - start
+        starts.append(start)
+        stops.append(stop)
+        subkey.append(k)
+    return starts, stops, tuple(subkey)
+
+
+def _get_selection_shape(shape, key):
+    """Get shape of outer indexing key applied to array of shape."""
+    out = []
+    for k, size in zip(key, shape):
+        if isinstance(k, slice):
+            out.append(len(range(*k.indices(size))))
+        elif not isinstance(k, (int, np.integer)):
+            out.append(len(k))
+    return tuple(out)
+
+
+class _RayBlockState(threading.local):
+    """Per thread state of a ray block read task, see _read_odim_ray_block.
+
+    probe : list of (shape, key) selections recorded instead of reading
+    reads : prefetched reads [(key, read), ...] keyed by id of array wrapper
+    """
+
+    probe = None
+    reads = None
+
+
+_ray_block = _RayBlockState()
+
+
+def _get_array_wrapper(var):
+    """Get H5NetCDFArrayWrapper below lazily indexed, decoded or rotated variable."""
+    array = var._data
+    while array is not None and not isinstance(array, H5NetCDFArrayWrapper):
+        if isinstance(array, Variable):
+            array = array._data
+        else:
+            array = getattr(array, "array", getattr(array, "source", None))
+    return array
+
+
+def _read_odim_ray_block(sources, dim, start, stop):
+    """Read block of rays of all moments of a sweep (dask task).
+
+    The file selections of the block are recorded from the first moment without
+    reading any data. The raw data of all moments with the same shape is then read
+    under one acquisition of the file lock. Decompression, decoding and regridding
+    is done afterwards, outside of the lock.
+    """
+    blocks = [src.isel({dim: slice(start, stop)}) for src in sources]
+    _ray_block.probe = selections = []
+    try:
+        blocks[0].values
+    finally:
+        _ray_block.probe = None
+
+    wrappers = {}
+    for wrapper in map(_get_array_wrapper, blocks):
+        if wrapper is not None and wrapper._offset is None:
+            wrappers.setdefault(id(wrapper.datastore.lock), []).append(wrapper)
+    reads = {}
+    for group in wrappers.values():
+        with group[0].datastore.lock:
+            for wrapper in group:
+                reads[id(wrapper)] = [
+                    (key, wrapper._read(key))
+                    for shape, key in selections
+                    if shape == wrapper.shape
+                ]
+
+    # selections not prefetched are read as usual
+    _ray_block.reads = reads
+    try:
+        return tuple(blk.values for blk in blocks)
+    finally:
+        _ray_block.reads = None
+
+
+def _get_filters(h5ds):
+    """Get HDF5 filter ids of h5py Dataset's filter pipeline."""
+    plist = h5ds.id.get_create_plist()
+    return {plist.get_filter(i)[0] for i in range(plist.get_nfilters())}
+
+
+def _read_raw_chunks(h5ds, starts, stops):
+    """Read raw (compressed) chunks of h5py Dataset overlapping hyperslab.
+
+    Only gzip (deflate) and shuffle filters are supported, None is returned
+    for any other layout or if a chunk is not stored or stored unfiltered.
+    """
+    if h5ds.chunks is None:
+        return None
+    filters = _get_filters(h5ds)
+    if h5py.h5z.FILTER_DEFLATE not in filters or filters - {
+        h5py.h5z.FILTER_DEFLATE,
+        h5py.h5z.FILTER_SHUFFLE,
+    }:
+        return None
+    offsets = itertools.product(
+        *[
+            range(start - start % chunk, stop, chunk)
+            for start, stop, chunk in zip(starts, stops, h5ds.chunks)
+        ]
+    )
+    raw = []
+    try:
+        for offset in offsets:
+            filter_mask, chunk = h5ds.id.read_direct_chunk(offset)
+            if filter_mask:
+                return None
+            raw.append((offset, chunk))
+    except (KeyError, OSError, RuntimeError, ValueError):
+        return None
+    return raw
+
+
+def _decompress_chunk(out, raw, starts, stops, chunks, dtype, shuffle):
+    """Decompress raw chunk and copy overlap with hyperslab into out."""
+    offset, chunk = raw
+    data = zlib.decompress(chunk)
+    if shuffle and dtype.itemsize > 1:
+        data = np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1).T.tobytes()
+    data = np.frombuffer(data, dtype=dtype).reshape(chunks)
+    src, dst = [], []
+    for off, start, stop, size in zip(offset, starts, stops, chunks):
+        lo, hi = max(off, start), min(off + size, stop)
+        src.append(slice(lo - off, hi - off))
+        dst.append(slice(lo - start, hi - start))
+    out[tuple(dst)] = data[tuple(src)]
+
+
+def _assemble_chunks(raw, starts, stops, chunks, dtype, shuffle, max_workers=None):
+    """Decompress raw chunks concurrently and assemble hyperslab.
+
+    zlib releases the GIL, so chunks are decompressed in parallel threads.
+    """
+    out = np.empty([stop - start for start, stop in zip(starts, stops)], dtype=dtype)
+    func = partial(
+        _decompress_chunk,
+        out,
+        starts=starts,
+        stops=stops,
+        chunks=chunks,
+        dtype=dtype,
+        shuffle=shuffle,
+    )
+    if len(raw) < 2:
+        list(map(func, raw))
+    else:
+        list(_get_decompress_executor(max_workers).map(func, raw))
+    return out
+
+
+_DECOMPRESS_EXECUTORS = {}
+_DECOMPRESS_EXECUTORS_LOCK = threading.Lock()
+
+
+def _get_decompress_executor(max_workers=None):
+    """Get module-level thread pool for chunk decompression, created on first use.
+
+    One pool per ``max_workers`` is shared by all reads (dask tasks, threads).
+    """
+    with _DECOMPRESS_EXECUTORS_LOCK:
+        executor = _DECOMPRESS_EXECUTORS.get(max_workers, None)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="xradar-decompress"
+            )
+            _DECOMPRESS_EXECUTORS[max_workers] = executor
+    return executor
+
+
+def _get_contiguous_offset(h5ds, filename):
+    """Get file offset of contiguous, unfiltered h5py Dataset.
+
+    Returns None if the data can't be memory-mapped from the (local) file.
+    """
+    if not isinstance(filename, (str, os.PathLike)) or not os.path.isfile(filename):
+        return None
+    if h5ds.chunks is not None or h5ds.external or _get_filters(h5ds):
+        return None
+    if h5ds.dtype.kind not in "biuf" or not h5ds.size:
+        return None
+    offset = h5ds.id.get_offset()
+    if offset is None or h5ds.id.get_storage_size() != h5ds.nbytes:
+        return None
+    return offset
+
+
 class H5NetCDFArrayWrapper(BackendArray):
     """H5NetCDFArrayWrapper
 
     adapted from https://github.com/pydata/xarray/
     """
 
-    __slots__ = ("datastore", "dtype", "shape", "variable_name")
+    __slots__ = ("datastore", "dtype", "shape", "variable_name", "_offset", "_mmap")
 
     def __init__(self, variable_name, datastore):
         self.datastore = datastore
@@ -388,6 +711,11 @@ class H5NetCDFArrayWrapper(BackendArray):
 
         array = self.get_array()
         self.shape = array.shape
+        # contiguous, unfiltered data is served from a memory map
+        self._offset = None
+        if getattr(datastore, "_use_mmap", False):
+            self._offset = _get_contiguous_offset(array._h5ds, datastore._filename)
+        self._mmap = None
 
         dtype = array.dtype
         if dtype is str:
@@ -404,22 +732,97 @@ class H5NetCDFArrayWrapper(BackendArray):
             if self.datastore.autoclose:
                 self.datastore.close(needs_lock=False)
 
+    def __getstate__(self):
+        # memory map is recreated (not copied) after unpickling
+        state = {k: getattr(self, k) for k in self.__slots__}
+        state["_mmap"] = None
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
     def get_array(self, needs_lock=True):
         ds = self.datastore._acquire(needs_lock)
         return ds.variables[self.variable_name]
 
+    def get_mmap(self):
+        if self._mmap is None:
+            # copy-on-write, the file is never modified
+            self._mmap = np.memmap(
+                self.datastore._filename,
+                dtype=self.dtype,
+                mode="c",
+                offset=self._offset,
+                shape=self.shape,
+            )
+        return self._mmap
+
     def __getitem__(self, key):
+        if self._offset is not None:
+            return indexing.explicit_indexing_adapter(
+                key, self.shape, indexing.IndexingSupport.OUTER, self._getitem_mmap
+            )
         return indexing.explicit_indexing_adapter(
             key, self.shape, indexing.IndexingSupport.OUTER_1VECTOR, self._getitem
         )
 
+    def _getitem_mmap(self, key):
+        # zero-copy for basic indexing, no file lock needed
+        array = indexing.NumpyIndexingAdapter(np.asarray(self.get_mmap()))
+        return array[indexing.OuterIndexer(key)]
+
     def _getitem(self, key):
         # h5py requires using lists for fancy indexing:
         # https://github.com/h5py/h5py/issues/992
         key = tuple(list(k) if isinstance(k, np.ndarray) else k for k in key)
+        # ray block read task of this thread, see _read_odim_ray_block
+        if _ray_block.probe is not None:
+            _ray_block.probe.append((self.shape, key))
+            return np.zeros(_get_selection_shape(self.shape, key), dtype=self.dtype)
+        if _ray_block.reads is not None:
+            reads = _ray_block.reads.get(id(self), [])
+            if reads and reads[0][0] == key:
+                return self._assemble(reads.pop(0)[1])
         with self.datastore.lock:
-            array = self.get_array(needs_lock=False)
-            return array[key]
+            read = self._read(key)
+        return self._assemble(read)
+
+    def _read(self, key):
+        """Read selection or its raw chunks, the caller holds the lock."""
+        workers = self.datastore._decompress_workers
+        selection = _get_chunk_selection(self.shape, key) if workers else None
+        array = self.get_array(needs_lock=False)
+        if selection is None:
+            return array[key], None
+        # only fetch raw chunks under the lock
+        h5ds = array._h5ds
+        raw = _read_raw_chunks(h5ds, *selection[:2])
+        if raw is None:
+            return array[key], None
+        return raw, (selection, h5ds.chunks, h5ds.dtype, h5ds.shuffle)
+
+    def _assemble(self, read):
+        """Decompress and assemble raw chunks of read, no lock needed."""
+        raw, chunked = read
+        if chunked is None:
+            return raw
+        (starts, stops, subkey), chunks, dtype, shuffle = chunked
+        workers = self.datastore._decompress_workers
+        out = _assemble_chunks(
+            raw,
+            starts,
+            stops,
+            chunks,
+            dtype,
+            shuffle,
+            max_workers=None if workers is True else workers,
+        )
+        # outer indexing of the hyperslab, one axis after another
+        for axis, k in reversed(list(enumerate(subkey))):
+            if not isinstance(k, slice):
+                out = np.take(out, k, axis=axis)
+        return out
 
 
 def _get_h5netcdf_encoding(self, var):
@@ -495,11 +898,25 @@ class OdimSubStore(AbstractDataStore):
         self._filename = store.filename
         self.is_remote = is_remote_uri(self._filename)
         self.lock = ensure_lock(lock)
+        self._decompress_workers = store._decompress_workers
+        self._use_mmap = store._use_mmap
+        self._prefetched = store._prefetched
+        # metadata snapshot is shared by all substores of one sweep
+        self._root = store.root
 
     @property
     def root(self):
+        return self._root
+
+    @property
+    def what(self):
+        with self.lock:
+            return self._get_what()
+
+    def _get_what(self):
+        # the caller holds the (non-reentrant) lock
         with self._manager.acquire_context(False) as root:
-            return _OdimH5NetCDFMetadata(root, self._group.lstrip("/"))
+            return _get_dset_what(root, self._group.lstrip("/"))
 
     def _acquire(self, needs_lock=True):
         with self._manager.acquire_context(needs_lock) as root:
@@ -513,10 +930,14 @@ class OdimSubStore(AbstractDataStore):
     def open_store_variable(self, name, var):
 
         dimensions = self.root.get_variable_dimensions(var.dimensions)
-        data = indexing.LazilyOuterIndexedArray(H5NetCDFArrayWrapper(name, self))
+        prefetched = (self._prefetched or {}).get(self._group.lstrip("/"), None)
+        if prefetched is not None and name == "data":
+            data = prefetched
+        else:
+            data = indexing.LazilyOuterIndexedArray(H5NetCDFArrayWrapper(name, self))
         encoding = _get_h5netcdf_encoding(self, var)
         encoding["group"] = self._group
-        name, attrs = _get_odim_variable_name_and_attrs(name, self.root.what)
+        name, attrs = _get_odim_variable_name_and_attrs(name, self._get_what())
 
         return name, Variable(dimensions, data, attrs, encoding)
 
@@ -524,23 +945,28 @@ class OdimSubStore(AbstractDataStore):
         return self.root.coordinates
 
     def get_variables(self):
-        return FrozenDict(
-            (k1, v1)
-            for k1, v1 in {
-                **dict(
-                    [
-                        self.open_store_variable(k, v)
-                        for k, v in self.ds.variables.items()
-                    ]
-                ),
-            }.items()
-        )
+        # groups, variables and their chunk/filter properties are read under the
+        # lock, the file handle is shared by concurrently opened sweeps
+        with self.lock:
+            return FrozenDict(
+                self.open_store_variable(k, v)
+                for k, v in self._acquire().variables.items()
+            )
 
 
 class OdimStore(AbstractDataStore):
     """Store for reading ODIM dataset groups via h5netcdf."""
 
-    def __init__(self, manager, group=None, lock=False):
+    def __init__(
+        self,
+        manager,
+        group=None,
+        lock=False,
+        moments=None,
+        decompress_workers=None,
+        use_mmap=False,
+        prefetched=None,
+    ):
 
         if isinstance(manager, (h5netcdf.File, h5netcdf.Group)):
             if group is None:
@@ -559,7 +985,15 @@ class OdimStore(AbstractDataStore):
         self._filename = self.filename
         self.is_remote = is_remote_uri(self._filename)
         self.lock = ensure_lock(lock)
+        if isinstance(moments, str):
+            moments = [moments]
+        self._moments = moments
+        self._decompress_workers = decompress_workers
+        self._use_mmap = use_mmap
+        # raw moment arrays already read from file, keyed by group name
+        self._prefetched = prefetched
         self._substore = None
+        self._root = None
         self._need_time_recalc = False
 
     @classmethod
@@ -573,12 +1007,32 @@ class OdimStore(AbstractDataStore):
         invalid_netcdf=None,
         phony_dims=None,
         decode_vlen_strings=True,
+        moments=None,
+        decompress_workers=None,
+        use_mmap=False,
+        max_memory=None,
+        file_decompress_workers=None,
     ):
-        if isinstance(filename, bytes):
-            raise ValueError(
-                "can't open netCDF4/HDF5 as bytes "
-                "try passing a path or file-like object"
+        # bytes-like objects are opened as in-memory HDF5 file image
+        opener = h5netcdf.File
+        compression = _get_compression(filename)
+        if compression is not None:
+            filename = _decompress_file(
+                filename,
+                compression,
+                max_memory=max_memory,
+                max_workers=file_decompress_workers,
             )
+        if isinstance(filename, (str, os.PathLike)) and not is_remote_uri(
+            os.fspath(filename)
+        ):
+            # memory maps are (re)created from the filename, possibly after
+            # unpickling in another working directory
+            filename = os.path.abspath(filename)
+        if isinstance(filename, (bytes, bytearray, memoryview)):
+            filename = _FileImage(filename)
+        if isinstance(filename, _FileImage):
+            opener = _H5NetCDFFileImage
 
         if format not in [None, "NETCDF4"]:
             raise ValueError("invalid format for h5netcdf backend")
@@ -597,47 +1051,67 @@ class OdimStore(AbstractDataStore):
         ) >= Version("3.0.0"):
             kwargs["decode_vlen_strings"] = decode_vlen_strings
 
-        if lock is None:
-            if has_import("dask"):
-                lock = HDF5_LOCK
-            else:
-                lock = False
+        lock = _get_odim_lock(lock, filename)
 
-        manager = CachingFileManager(h5netcdf.File, filename, mode=mode, kwargs=kwargs)
-        return cls(manager, group=group, lock=lock)
+        manager = CachingFileManager(opener, filename, mode=mode, kwargs=kwargs)
+        return cls(
+            manager,
+            group=group,
+            lock=lock,
+            moments=moments,
+            decompress_workers=decompress_workers,
+            use_mmap=use_mmap,
+        )
 
     @property
     def filename(self):
         with self._manager.acquire_context(False) as root:
             return root.filename
 
+    def close(self, **kwargs):
+        self._manager.close(**kwargs)
+
+    @property
+    def root(self):
+        if self._root is None:
+            with self.lock, self._manager.acquire_context(False) as root:
+                self._root = _OdimH5NetCDFMetadata(root, self._group.lstrip("/"))
+        return self._root
+
     @property
     def substore(self):
         if self._substore is None:
-            with self._manager.acquire_context(False) as root:
+            with self.lock, self._manager.acquire_context(False) as root:
                 subgroups = [
                     "/".join([self._group, k])
                     for k in root[self._group].groups
                     # get data and quality groups
-                    if "data" or "quality" in k
+                    if k.startswith(("data", "quality"))
                 ]
-                substore = []
-                substore.extend(
-                    [
-                        OdimSubStore(
-                            self,
-                            group=group,
-                            lock=self.lock,
-                        )
-                        for group in subgroups
+                # only keep wanted moments, resolved by quantity
+                if self._moments is not None:
+                    subgroups = [
+                        grp
+                        for grp in subgroups
+                        if _get_dset_quantity(root, grp.lstrip("/")) in self._moments
                     ]
-                )
-                self._substore = substore
+            substore = []
+            substore.extend(
+                [
+                    OdimSubStore(
+                        self,
+                        group=group,
+                        lock=self.lock,
+                    )
+                    for group in subgroups
+                ]
+            )
+            self._substore = substore
 
         return self._substore
 
     def open_store_coordinates(self):
-        return self.substore[0].open_store_coordinates()
+        return self.root.coordinates
 
     def get_variables(self):
         return FrozenDict(
@@ -655,7 +1129,7 @@ class OdimStore(AbstractDataStore):
         )
 
     def get_attrs(self):
-        dim, angle = self.substore[0].root.fixed_dim_and_angle
+        dim, angle = self.root.fixed_dim_and_angle
         attributes = {}
         # attributes["fixed_angle"] = angle.item()
         return FrozenDict(attributes)
@@ -677,10 +1151,44 @@ class OdimBackendEntrypoint(BackendEntrypoint):
         fixes erroneous azimuth data. Defaults to True.
     reindex_angle : bool or float
         Defaults to False, no reindexing. If True reindex angle with tol=0.4deg. If
-        given a floating point number, it is used as tolerance.
+        given a floating point number, it is used as tolerance. Rays are snapped to
+        a regular angle grid, full scans and sectors are supported.
         Only invoked if `decode_coord=True`.
+    moments : list of str, optional
+        Moment names (ODIM ``quantity``) to extract, defaults to all moments.
+        Groups of other moments are not read at all.
+    decode_dtype : str or numpy.dtype, optional
+        Floating dtype (eg. "float32") packed moments are decoded into directly,
+        instead of xarray's default choice. If "raw", moments are kept as packed
+        values with ``scale_factor``, ``add_offset`` and ``_FillValue`` attributes,
+        which are applied lazily with ``ds.packed.decode(dtype="float32")``
+        (``mask_undetect=True`` also masks ``_Undetect``). Defaults to None.
+    lock : bool, str or Lock-like, optional
+        Locking strategy for file access. None, True or "file" (default) uses one lock
+        per file, so threads reading different files run concurrently. "global"
+        serializes access to all files. False disables locking (thread-safe h5py
+        builds), "process" is the same for process pools, where every process
+        opens its own file handle.
+    decompress_workers : int or bool, optional
+        If given, gzip compressed moments are read as raw chunks and decompressed
+        concurrently on a thread pool with this number of threads (True: default
+        pool size), outside of the file lock. Defaults to None, decompression by
+        the HDF5 library.
+    use_mmap : bool
+        If True, contiguous, unfiltered moments of local files are served from a
+        (copy-on-write) :py:class:`numpy.memmap` at the dataset's file offset,
+        bypassing h5py and the file lock. Defaults to False.
+    max_memory : int, optional
+        Gzip (``.gz``) and bzip2 (``.bz2``) compressed files are decompressed into an
+        in-memory HDF5 file image, no file is written. Maximum size of the image in
+        bytes, defaults to 1 GiB.
+    file_decompress_workers : int or bool, optional
+        Number of threads to decompress multi-member compressed files (BGZF,
+        pbzip2) in parallel (True: default pool size). Defaults to None, serial
+        decompression.
     """
 
+    @_cached
     def open_dataset(
         self,
         filename_or_obj,
@@ -701,24 +1209,51 @@ class OdimBackendEntrypoint(BackendEntrypoint):
         keep_azimuth=True,
         reindex_angle=False,
         first_dim="time",
+        moments=None,
+        decode_dtype=None,
+        lock=None,
+        decompress_workers=None,
+        use_mmap=False,
+        max_memory=None,
+        file_decompress_workers=None,
     ):
 
-        if isinstance(filename_or_obj, io.IOBase):
-            filename_or_obj.seek(0)
+        if isinstance(filename_or_obj, AbstractDataStore):
+            # already opened store, eg. sharing one file handle from
+            # open_odim_datatree or a reference store, the group is defined
+            # by the store
+            store = filename_or_obj
+        else:
+            if isinstance(filename_or_obj, io.IOBase):
+                filename_or_obj.seek(0)
+
+            store = OdimStore.open(
+                filename_or_obj,
+                format=format,
+                group=group,
+                invalid_netcdf=invalid_netcdf,
+                phony_dims=phony_dims,
+                decode_vlen_strings=decode_vlen_strings,
+                moments=moments,
+                lock=lock,
+                decompress_workers=decompress_workers,
+                use_mmap=use_mmap,
+                max_memory=max_memory,
+                file_decompress_workers=file_decompress_workers,
+            )
 
-        store = OdimStore.open(
-            filename_or_obj,
-            format=format,
-            group=group,
-            invalid_netcdf=invalid_netcdf,
-            phony_dims=phony_dims,
-            decode_vlen_strings=decode_vlen_strings,
-        )
+        # packed moments decoding policy
+        decode_dtype = _get_decode_dtype(decode_dtype)
+        decode_store = store
+        if decode_dtype == "raw":
+            mask_and_scale = False
+        elif decode_dtype is not None and mask_and_scale:
+            decode_store = _DecodeDtypeStore(store, decode_dtype)
 
         store_entrypoint = StoreBackendEntrypoint()
 
         ds = store_entrypoint.open_dataset(
-            store,
+            decode_store,
             mask_and_scale=mask_and_scale,
             decode_times=decode_times,
             concat_characters=concat_characters,
@@ -730,26 +1265,27 @@ class OdimBackendEntrypoint(BackendEntrypoint):
 
         ds.encoding["engine"] = "odim"
 
-        if decode_coords and reindex_angle is not False:
-            ds = ds.pipe(_reindex_angle, store=store, tol=reindex_angle)
-
-        if not keep_azimuth:
-            if ds.azimuth.dims[0] == "elevation":
-                ds = ds.assign_coords({"azimuth": ds.azimuth.pipe(_fix_angle)})
-        if not keep_elevation:
-            if ds.elevation.dims[0] == "azimuth":
-                ds = ds.assign_coords({"elevation": ds.elevation.pipe(_fix_angle)})
+        # regularize ray angles and fix secondary angle in one pass
+        if ds.azimuth.dims[0] == "elevation":
+            fix_secondary = not keep_azimuth
+        else:
+            fix_secondary = not keep_elevation
+        if not decode_coords:
+            reindex_angle = False
+        ds = _regularize_angle(
+            ds, store=store, tol=reindex_angle, fix_secondary=fix_secondary
+        )
 
         # handling first dimension
         dim0 = "elevation" if ds.sweep_mode.load() == "rhi" else "azimuth"
         if first_dim == "auto":
             if "time" in ds.dims:
                 ds = ds.swap_dims({"time": dim0})
-            ds = ds.sortby(dim0)
+            ds = _sortby_dim(ds, dim0)
         else:
             if "time" not in ds.dims:
                 ds = ds.swap_dims({dim0: "time"})
-            ds = ds.sortby("time")
+            ds = _sortby_dim(ds, "time")
 
         # reassign azimuth/elevation/time coordinates
         ds = ds.assign_coords({"azimuth": ds.azimuth})
@@ -765,10 +1301,18 @@ class OdimBackendEntrypoint(BackendEntrypoint):
             }
         )
 
+        # dask chunks aligned with the compressed HDF5 chunks
+        ds = _assign_preferred_chunks(ds)
+
         return ds
 
 
-def _get_h5group_names(filename, engine):
+def _get_h5group_names(filename_or_obj, engine):
+    """Return sweep group names of given engine.
+
+    ``filename_or_obj`` can also be an already opened ``h5netcdf.File``, which is
+    then used as is and not closed.
+    """
     if engine == "odim":
         groupname = "dataset"
     elif engine == "gamic":
@@ -777,24 +1321,210 @@ def _get_h5group_names(filename, engine):
         groupname = "sweep"
     else:
         raise ValueError(f"xradar: unknown engine `{engine}`.")
-    with h5netcdf.File(filename, "r", decode_vlen_strings=True) as fh:
+    if isinstance(filename_or_obj, h5netcdf.File):
+        fh = filename_or_obj
+        return ["/".join(["", grp]) for grp in fh.groups if groupname in grp.lower()]
+    with h5netcdf.File(filename_or_obj, "r", decode_vlen_strings=True) as fh:
         groups = ["/".join(["", grp]) for grp in fh.groups if groupname in grp.lower()]
-    if isinstance(filename, io.BytesIO):
-        filename.seek(0)
+    if isinstance(filename_or_obj, io.BytesIO):
+        filename_or_obj.seek(0)
     return groups
 
 
+def _open_odim_volume_store(filename_or_obj, kwargs):
+    """Open ODIM_H5 file once for use with all groups of the volume."""
+    if isinstance(filename_or_obj, io.IOBase):
+        filename_or_obj.seek(0)
+    store_kwargs = {"phony_dims": "access"}
+    store_kwargs.update(
+        {
+            k: v
+            for k, v in kwargs.items()
+            if k
+            in [
+                "format",
+                "invalid_netcdf",
+                "phony_dims",
+                "decode_vlen_strings",
+                "lock",
+                "decompress_workers",
+                "use_mmap",
+                "max_memory",
+                "file_decompress_workers",
+            ]
+        }
+    )
+    return OdimStore.open(filename_or_obj, **store_kwargs)
+
+
+def _get_odim_sweep_angles(fileobj, sweeps):
+    """Get elevation and fixed angle of sweeps from ``where`` attributes."""
+    elevation = []
+    fixed_angle = []
+    for swp in sweeps:
+        where = fileobj[swp.lstrip("/")]["where"].attrs
+        elevation.append(where.get("elangle", np.nan))
+        fixed_angle.append(_get_fixed_dim_and_angle(where)[1])
+    return np.array(elevation, dtype=float), np.array(fixed_angle, dtype=float)
+
+
+def _timestamp_to_datetime64(timestamp):
+    """Convert seconds since epoch to datetime64 (milliseconds)."""
+    return np.datetime64(int(round(timestamp * 1000)), "ms")
+
+
+def _scan_odim_volume(filename):
+    """Scan ODIM_H5 volume metadata from attributes only, no data is read.
+
+    Returns
+    -------
+    site : tuple
+        Longitude, latitude and altitude of the radar site.
+    sweeps : list of tuple
+        Per sweep: sweep number, sweep mode, fixed angle, nrays, nbins, range
+        resolution, start time and end time (datetime64).
+    moments : list of tuple
+        Per sweep: moment names (ODIM ``quantity``).
+    """
+    import h5py
+
+    site = None
+    sweeps = []
+    moments = []
+    with h5py.File(filename, "r") as fh:
+        # numerical order, h5py iterates dataset1, dataset10, dataset2, ...
+        groups = sorted(
+            (grp for grp in fh if grp.startswith("dataset")), key=lambda g: int(g[7:])
+        )
+        for grp in groups:
+            md = _OdimH5NetCDFMetadata(fh, grp)
+            if site is None:
+                site = md.site_coords
+            dim, angle = md.fixed_dim_and_angle
+            sweep_mode = "azimuth_surveillance" if dim == "azimuth" else "rhi"
+            where = md._where
+            sweeps.append(
+                (
+                    int(grp[7:]),
+                    sweep_mode,
+                    angle,
+                    where["nrays"],
+                    where["nbins"],
+                    where["rscale"],
+                    _timestamp_to_datetime64(md._get_time("start")),
+                    _timestamp_to_datetime64(md._get_time("end")),
+                )
+            )
+            moments.append(
+                tuple(
+                    _get_dset_quantity(fh, f"{grp}/{sub}")
+                    for sub in fh[grp]
+                    if sub.startswith(("data", "quality"))
+                )
+            )
+    return site, sweeps, moments
+
+
+def _read_odim_moments(fileobj, sweeps, moments=None):
+    """Read raw data of all moments of sweeps in one pass.
+
+    Moments of one sweep with equal shape and dtype are read into one preallocated
+    contiguous block.
+
+    Returns
+    -------
+    moments : dict
+        Raw moment arrays keyed by group name (eg. ``dataset1/data1``).
+    """
+    out = {}
+    for swp in sweeps:
+        swp = swp.lstrip("/")
+        groups = [
+            f"{swp}/{k}"
+            for k in fileobj[swp].groups
+            if k.startswith(("data", "quality"))
+        ]
+        if moments is not None:
+            groups = [g for g in groups if _get_dset_quantity(fileobj, g) in moments]
+        h5ds = {g: fileobj[g].variables["data"]._h5ds for g in groups}
+
+        def key(g):
+            return h5ds[g].shape, h5ds[g].dtype.str
+
+        for (shape, dtype), grps in itertools.groupby(sorted(groups, key=key), key):
+            grps = list(grps)
+            block = np.empty((len(grps),) + shape, dtype=dtype)
+            for arr, g in zip(block, grps):
+                if arr.size:
+                    h5ds[g].read_direct(arr)
+                out[g] = arr
+    return out
+
+
+def _open_odim_sweep(store, kwargs, group, moments=None):
+    """Open sweep group using the file handle of the volume store."""
+    return xr.open_dataset(
+        OdimStore(
+            store._manager,
+            group=group,
+            lock=store.lock,
+            moments=moments,
+            decompress_workers=store._decompress_workers,
+            use_mmap=store._use_mmap,
+            prefetched=store._prefetched,
+        ),
+        engine="odim",
+        **kwargs,
+    )
+
+
+def _get_odim_time_coverage(fileobj, sweeps):
+    """Get volume time coverage from ``what`` attributes only.
+
+    Uses ``startdate/starttime`` and ``enddate/endtime`` of the sweeps, falls back
+    to ``what/date`` and ``what/time`` of the root group.
+    """
+    times = []
+    for swp in sweeps:
+        what = _get_group_attrs(fileobj[swp.lstrip("/")], "what")
+        for point in ["start", "end"]:
+            date = what.get(f"{point}date", what.get("startdate", None))
+            time = what.get(f"{point}time", what.get("starttime", None))
+            if date is not None and time is not None:
+                times.append(_maybe_decode(date) + _maybe_decode(time))
+    if not times:
+        what = _get_group_attrs(fileobj, "what")
+        times.append(_maybe_decode(what["date"]) + _maybe_decode(what["time"]))
+    times = [dt.datetime.strptime(t, "%Y%m%d%H%M%S") for t in times]
+    return [t.strftime("%Y-%m-%dT%H:%M:%SZ") for t in [min(times), max(times)]]
+
+
+def _get_odim_root_dataset(store, sweeps=None):
+    """Create root Dataset from already opened ODIM_H5 file.
+
+    If ``sweeps`` are given, the time coverage is added from their attributes.
+    """
+    with store.lock, store._manager.acquire_context(False) as root:
+        attrs = {k: _maybe_decode(v) for k, v in root.attrs.items()}
+        ds = xr.Dataset(attrs=attrs)
+        if sweeps is not None:
+            start, end = _get_odim_time_coverage(root, sweeps)
+            ds = ds.assign(time_coverage_start=start, time_coverage_end=end)
+    return ds
+
+
 def _assign_root(sweeps):
     """(Re-)Create root object according CfRadial2 standard"""
-    # extract time coverage
-    times = np.array(
-        [[ts.time.values.min(), ts.time.values.max()] for ts in sweeps[1:]]
-    ).flatten()
-    time_coverage_start = min(times)
-    time_coverage_end = max(times)
-
-    time_coverage_start_str = str(time_coverage_start)[:19] + "Z"
-    time_coverage_end_str = str(time_coverage_end)[:19] + "Z"
+    # extract time coverage, if not already given from metadata
+    if "time_coverage_start" in sweeps[0] and "time_coverage_end" in sweeps[0]:
+        time_coverage_start_str = sweeps[0]["time_coverage_start"].item()
+        time_coverage_end_str = sweeps[0]["time_coverage_end"].item()
+    else:
+        times = np.array(
+            [[ts.time.values.min(), ts.time.values.max()] for ts in sweeps[1:]]
+        ).flatten()
+        time_coverage_start_str = str(min(times))[:19] + "Z"
+        time_coverage_end_str = str(max(times))[:19] + "Z"
 
     # create root group from scratch
     root = xr.Dataset()  # data_vars=wrl.io.xarray.global_variables,
@@ -838,14 +1568,16 @@ def _assign_root(sweeps):
     return root
 
 
+@_cached
 def open_odim_datatree(filename_or_obj, **kwargs):
     """Open ODIM_H5 dataset as xradar Datatree.
 
     Parameters
     ----------
-    filename_or_obj : str, Path, file-like or DataStore
+    filename_or_obj : str, Path, file-like, bytes-like or DataStore
         Strings and Path objects are interpreted as a path to a local or remote
-        radar file
+        radar file. Bytes-like objects (bytes, bytearray, memoryview) are opened as
+        in-memory HDF5 file image.
 
     Keyword Arguments
     -----------------
@@ -863,8 +1595,47 @@ def open_odim_datatree(filename_or_obj, **kwargs):
         fixes erroneous azimuth data. Defaults to True.
     reindex_angle : bool or float
         Defaults to False, no reindexing. If True reindex angle with tol=0.4deg. If
-        given a floating point number, it is used as tolerance.
+        given a floating point number, it is used as tolerance. Rays are snapped to
+        a regular angle grid, full scans and sectors are supported.
         Only invoked if `decode_coord=True`.
+    parallel : bool or str
+        Defaults to False, sweeps are created one after another. If True or "thread"
+        sweeps are created concurrently on a thread pool, sharing the file handle.
+    max_workers : int, optional
+        Maximum number of workers for ``parallel``.
+    moments : list of str, optional
+        Moment names (ODIM ``quantity``) to extract, defaults to all moments.
+        Groups of other moments are not read at all.
+    lock : bool, str or Lock-like, optional
+        Locking strategy for file access, see
+        :class:`xradar.io.backends.odim.OdimBackendEntrypoint`. Defaults to one lock
+        per file.
+    decompress_workers : int or bool, optional
+        Decompress raw chunks on a thread pool, see
+        :class:`xradar.io.backends.odim.OdimBackendEntrypoint`.
+    use_mmap : bool
+        Memory-map contiguous, unfiltered moments, see
+        :class:`xradar.io.backends.odim.OdimBackendEntrypoint`. Defaults to False.
+    max_memory : int, optional
+        Memory budget for decompressing ``.gz``/``.bz2`` files, see
+        :class:`xradar.io.backends.odim.OdimBackendEntrypoint`.
+    file_decompress_workers : int or bool, optional
+        Decompress multi-member ``.gz``/``.bz2`` files in parallel, see
+        :class:`xradar.io.backends.odim.OdimBackendEntrypoint`.
+    elevation_range : tuple of float, optional
+        Only extract sweeps with ``where/elangle`` within (lo, hi), inclusive.
+    fixed_angles : float or list of float, optional
+        Only extract sweeps with given fixed angle(s) (elevation for PPI, azimuth
+        for RHI), with a tolerance of 0.05 deg.
+    load : {"lazy", "eager"}
+        Defaults to "lazy", moments are read on access. If "eager", all wanted
+        moments of all sweeps are read in one locked pass into contiguous arrays
+        and an in-memory DataTree is returned, the file is closed.
+    dask_graph : {"variable", "sweep"}
+        Only used with ``chunks``. Defaults to "variable", each moment chunk is read
+        by its own task. If "sweep", a single task reads all moments of a chunk of
+        rays (the whole sweep by default) under one acquisition of the file lock and
+        the moment chunks are sliced from it.
     kwargs :  kwargs
         Additional kwargs are fed to `xr.open_dataset`.
 
@@ -877,9 +1648,29 @@ def open_odim_datatree(filename_or_obj, **kwargs):
     backend_kwargs = kwargs.pop("backend_kwargs", {})
     # first_dim = backend_kwargs.pop("first_dim", None)
     sweep = kwargs.pop("sweep", None)
+    parallel = kwargs.pop("parallel", False)
+    max_workers = kwargs.pop("max_workers", None)
+    moments = kwargs.pop("moments", backend_kwargs.pop("moments", None))
+    load = _get_load_mode(kwargs.pop("load", "lazy"))
+    elevation_range = kwargs.pop("elevation_range", None)
+    fixed_angles = kwargs.pop("fixed_angles", None)
+    dask_graph = kwargs.pop("dask_graph", "variable")
+    if dask_graph not in ["variable", "sweep"]:
+        raise ValueError(
+            f"xradar: unknown dask_graph {dask_graph!r}, use 'variable' or 'sweep'"
+        )
+    chunks = None
+    if dask_graph == "sweep" and load == "lazy":
+        # open lazily, chunks are created per sweep below
+        chunks = kwargs.pop("chunks", None)
+        if chunks is not None:
+            kwargs["cache"] = False
     sweeps = []
     kwargs["backend_kwargs"] = backend_kwargs
 
+    # open file only once, the file handle is shared by all sweeps and root
+    store = _open_odim_volume_store(filename_or_obj, {**kwargs, **backend_kwargs})
+
     if isinstance(sweep, str):
         sweeps = [sweep]
     elif isinstance(sweep, int):
@@ -890,14 +1681,55 @@ def open_odim_datatree(filename_or_obj, **kwargs):
         else:
             sweeps.extend(sweep)
     else:
-        sweeps = _get_h5group_names(filename_or_obj, "odim")
+        with store._manager.acquire_context(False) as root:
+            sweeps = _get_h5group_names(root, "odim")
+
+    # select sweeps by angle from where-attributes only
+    if elevation_range is not None or fixed_angles is not None:
+        with store.lock, store._manager.acquire_context(False) as root:
+            elevation, fixed_angle = _get_odim_sweep_angles(root, sweeps)
+        sweeps = _select_sweeps_by_angle(
+            sweeps,
+            elevation,
+            fixed_angle,
+            elevation_range=elevation_range,
+            fixed_angles=fixed_angles,
+        )
+
+    # read all wanted moments of all sweeps in one locked pass
+    if load == "eager":
+        if isinstance(moments, str):
+            moments = [moments]
+        with store.lock, store._manager.acquire_context(False) as root:
+            store._prefetched = _read_odim_moments(root, sweeps, moments=moments)
+
+    ds = _map_sweeps(
+        partial(_open_odim_sweep, store, kwargs, moments=moments),
+        sweeps,
+        parallel=parallel,
+        max_workers=max_workers,
+    )
+
+    # one read task per chunk of rays for all moments of a sweep, the dask keys
+    # depend on all open options (eg. decode_dtype, first_dim, reindex_angle)
+    if chunks is not None:
+        ds = [
+            _coalesce_chunks(
+                swp,
+                chunks,
+                _get_token(filename_or_obj, grp, chunks, moments, kwargs),
+                read=_read_odim_ray_block,
+            )
+            for swp, grp in zip(ds, sweeps)
+        ]
 
-    ds = [
-        xr.open_dataset(filename_or_obj, group=swp, engine="odim", **kwargs)
-        for swp in sweeps
-    ]
+    # root group from attributes only, no sweep data is touched
+    ds.insert(0, _get_odim_root_dataset(store, sweeps))
 
-    ds.insert(0, xr.open_dataset(filename_or_obj, group="/"))
+    # decode in memory, the file is not needed anymore
+    if load == "eager":
+        ds = [swp.load() for swp in ds]
+        store.close()
 
     # create datatree root node with required data
     dtree = DataTree(data=_assign_root(ds), name="root")
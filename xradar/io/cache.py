@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# Copyright (c) 2022, openradar developers.
+# Distributed under the MIT License. See LICENSE for more info.
+
+"""
+
+Dataset Cache
+=============
+
+This sub-module contains an opt-in, size-bounded LRU cache of built sweep
+xarray.Dataset and volume datatree.Datatree. Entries are keyed by file identity (path,
+modification time, size) and the open options (group, backend kwargs), so changed files
+are never served from the cache. Cached objects are returned as shallow copies, the
+lazy data is read on access as usual.
+
+Example::
+
+    import xarray as xr
+    import xradar as xd
+
+    cache = xd.io.enable_cache(maxsize=64, maxbytes=256 * 2**20)
+    ds = xr.open_dataset(filename, engine="odim", group="dataset1")
+    ds = xr.open_dataset(filename, engine="odim", group="dataset1")  # cache hit
+    cache.cache_info()
+
+.. autosummary::
+   :nosignatures:
+   :toctree: generated/
+
+   {}
+
+"""
+
+__all__ = [
+    "DatasetCache",
+    "disable_cache",
+    "enable_cache",
+    "get_cache",
+]
+
+__doc__ = __doc__.format("\n   ".join(__all__))
+
+import inspect
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "invalidations", "currsize", "nbytes"],
+)
+
+_cache = None
+# per thread switch to open without the cache, eg. the root dataset of a cached
+# datatree
+_local = threading.local()
+
+
+def _freeze(value):
+    """Convert value into hashable representation, raise TypeError if impossible."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    hash(value)
+    return value
+
+
+def _get_nbytes(obj):
+    """Get size of Dataset/DataTree including lazy data.
+
+    Lazy data is counted as well, it is kept in memory by the (shared) caches of the
+    cached object, once loaded from any of the returned copies.
+    """
+    if hasattr(obj, "subtree"):
+        return sum(_get_nbytes(node.ds) for node in obj.subtree)
+    return sum(var.nbytes for var in obj.variables.values())
+
+
+def _shallow_copy(obj):
+    """Shallow copy of Dataset/DataTree, the (lazy) data is shared."""
+    return obj.copy(deep=False)
+
+
+class DatasetCache:
+    """Size-bounded LRU cache of opened Datasets and DataTrees.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries, defaults to 128. None for no limit.
+    maxbytes : int, optional
+        Maximum size of all entries in bytes, defaults to None, no limit. All
+        variables are counted with their full size, also if not yet loaded.
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.cache_info()}>"
+
+    def cache_info(self):
+        """Return cache statistics.
+
+        Returns
+        -------
+        info : namedtuple
+            hits, misses, evictions, invalidations, currsize (entries) and nbytes.
+        """
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self._invalidations,
+                len(self._entries),
+                self._nbytes,
+            )
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self._nbytes -= nbytes
+
+    def get(self, key):
+        """Return cached object for key (most recently used) or None."""
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                self._misses += 1
+                # drop stale entries of changed files
+                path, identity = key[1], key[2]
+                stale = [k for k in self._entries if k[1] == path and k[2] != identity]
+                for k in stale:
+                    self._remove(k)
+                self._invalidations += len(stale)
+                return None
+            self._hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, obj):
+        """Add object to cache, evicting least recently used entries."""
+        nbytes = _get_nbytes(obj)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.maxbytes is not None and nbytes > self.maxbytes:
+                return
+            self._entries[key] = (obj, nbytes)
+            self._nbytes += nbytes
+            while (self.maxsize is not None and len(self._entries) > self.maxsize) or (
+                self.maxbytes is not None and self._nbytes > self.maxbytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self, path=None):
+        """Remove entries of given file or all entries.
+
+        Parameters
+        ----------
+        path : str or os.PathLike, optional
+            File to invalidate, defaults to all files.
+
+        Returns
+        -------
+        count : int
+            Number of removed entries.
+        """
+        with self._lock:
+            if path is None:
+                keys = list(self._entries)
+            else:
+                path = os.path.abspath(os.fspath(path))
+                keys = [k for k in self._entries if k[1] == path]
+            for k in keys:
+                self._remove(k)
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Remove all entries and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._hits = self._misses = 0
+            self._evictions = self._invalidations = 0
+
+
+def enable_cache(maxsize=128, maxbytes=None):
+    """Enable global cache of opened Datasets and DataTrees.
+
+    Used by the xradar backends (``xr.open_dataset(..., engine="odim")``) and
+    datatree functions for local files.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries, defaults to 128.
+    maxbytes : int, optional
+        Maximum size of all entries in bytes (including lazy variables), defaults
+        to no limit.
+
+    Returns
+    -------
+    cache : xradar.io.cache.DatasetCache
+    """
+    global _cache
+    _cache = DatasetCache(maxsize=maxsize, maxbytes=maxbytes)
+    return _cache
+
+
+def disable_cache():
+    """Disable and clear global cache."""
+    global _cache
+    if _cache is not None:
+        _cache.clear()
+    _cache = None
+
+
+def get_cache():
+    """Return global cache, None if disabled."""
+    return _cache
+
+
+def _get_cache_key(func, signature, args, kwargs):
+    """Get cache key (name, path, identity, options) or None if not cacheable."""
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        return None
+    bound.apply_defaults()
+    options = dict(bound.arguments)
+    options.pop("self", None)
+    filename = options.pop("filename_or_obj", None)
+    if not isinstance(filename, (str, os.PathLike)):
+        return None
+    path = os.path.abspath(os.fspath(filename))
+    try:
+        stat = os.stat(path)
+        options = _freeze(options)
+    except (OSError, TypeError):
+        return None
+    return func.__qualname__, path, (stat.st_mtime_ns, stat.st_size), options
+
+
+@contextmanager
+def _uncached():
+    """Context manager, open functions in this thread do not use the cache."""
+    previous = getattr(_local, "disabled", False)
+    _local.disabled = True
+    try:
+        yield
+    finally:
+        _local.disabled = previous
+
+
+def _cached(func):
+    """Serve results of open function from the global cache, if enabled."""
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = _cache
+        key = None
+        if cache is not None and not getattr(_local, "disabled", False):
+            key = _get_cache_key(func, signature, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+        obj = cache.get(key)
+        if obj is None:
+            obj = func(*args, **kwargs)
+            cache.put(key, obj)
+        return _shallow_copy(obj)
+
+    return wrapper
@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+# Copyright (c) 2022, openradar developers.
+# Distributed under the MIT License. See LICENSE for more info.
+
+"""
+
+Catalog
+=======
+
+This sub-module contains a persistent, incrementally updatable on-disk (SQLite)
+catalog of ODIM_H5 and CfRadial1 volumes. The catalog is filled from metadata-only
+volume scans and keyed by file path, modification time and size. Volumes can be
+queried by time window, site and elevation and opened as datatree.Datatree.
+
+Example::
+
+    import xradar as xd
+    with xd.io.RadarCatalog("catalog.sqlite") as cat:
+        cat.update("/archive", pattern="*.h5")
+        dtrees = cat.open_datatrees(
+            start="2018-12-20T06:00", end="2018-12-20T07:00", elevation_range=(0, 2)
+        )
+
+.. autosummary::
+   :nosignatures:
+   :toctree: generated/
+
+   {}
+
+"""
+
+__all__ = [
+    "RadarCatalog",
+]
+
+__doc__ = __doc__.format("\n   ".join(__all__))
+
+import glob
+import os
+import sqlite3
+import warnings
+from functools import partial
+
+import numpy as np
+
+from .backends.cfradial1 import open_cfradial1_datatree
+from .backends.common import _map_parallel
+from .backends.odim import open_odim_datatree
+from .scan import VolumeRecord, scan_volume, sweep_record_dtype
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    path TEXT PRIMARY KEY,
+    engine TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    longitude REAL,
+    latitude REAL,
+    altitude REAL,
+    time_start INTEGER,
+    time_end INTEGER
+);
+CREATE TABLE IF NOT EXISTS sweeps (
+    path TEXT NOT NULL REFERENCES volumes(path) ON DELETE CASCADE,
+    sweep_number INTEGER NOT NULL,
+    sweep_mode TEXT,
+    fixed_angle REAL,
+    nrays INTEGER,
+    nbins INTEGER,
+    range_resolution REAL,
+    start_time INTEGER,
+    end_time INTEGER,
+    moments TEXT,
+    PRIMARY KEY (path, sweep_number)
+);
+CREATE TABLE IF NOT EXISTS moments (
+    path TEXT NOT NULL REFERENCES volumes(path) ON DELETE CASCADE,
+    moment TEXT NOT NULL,
+    PRIMARY KEY (path, moment)
+);
+CREATE INDEX IF NOT EXISTS moments_moment ON moments (moment, path);
+CREATE INDEX IF NOT EXISTS volumes_time ON volumes (time_start, time_end);
+CREATE INDEX IF NOT EXISTS volumes_site ON volumes (longitude, latitude);
+"""
+
+_openers = {
+    "odim": open_odim_datatree,
+    "cfradial1": open_cfradial1_datatree,
+}
+
+
+def _to_ms(time):
+    """Convert time (str, datetime, datetime64) to integer milliseconds since epoch."""
+    if time is None:
+        return None
+    return int(np.datetime64(time, "ms").astype("int64"))
+
+
+def _scan_file(path, engine=None):
+    """Scan file, returns VolumeRecord or error message."""
+    try:
+        return scan_volume(path, engine=engine)
+    except Exception as err:
+        return f"{type(err).__name__}: {err}"
+
+
+class RadarCatalog:
+    """Persistent SQLite catalog of radar volumes.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        SQLite database file, created if missing. Use ":memory:" for a
+        non-persistent catalog.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._con = sqlite3.connect(self.path)
+        self._con.execute("PRAGMA foreign_keys = ON")
+        self._con.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._con.execute("SELECT COUNT(*) FROM volumes").fetchone()[0]
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.path!r} volumes={len(self)}>"
+
+    def close(self):
+        self._con.close()
+
+    def _is_current(self, path, stat):
+        row = self._con.execute(
+            "SELECT mtime, size FROM volumes WHERE path = ?", (path,)
+        ).fetchone()
+        return row is not None and row == (stat.st_mtime, stat.st_size)
+
+    def _insert(self, record, stat):
+        self._con.execute("DELETE FROM volumes WHERE path = ?", (record.path,))
+        sweeps = record.sweeps
+        start = sweeps["start_time"].min() if len(sweeps) else None
+        end = sweeps["end_time"].max() if len(sweeps) else None
+        self._con.execute(
+            "INSERT INTO volumes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record.path,
+                record.engine,
+                stat.st_mtime,
+                stat.st_size,
+                float(record.longitude),
+                float(record.latitude),
+                float(record.altitude),
+                _to_ms(start),
+                _to_ms(end),
+            ),
+        )
+        self._con.executemany(
+            "INSERT INTO sweeps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    record.path,
+                    int(swp["sweep_number"]),
+                    str(swp["sweep_mode"]),
+                    float(swp["fixed_angle"]),
+                    int(swp["nrays"]),
+                    int(swp["nbins"]),
+                    float(swp["range_resolution"]),
+                    _to_ms(swp["start_time"]),
+                    _to_ms(swp["end_time"]),
+                    ",".join(moments),
+                )
+                for swp, moments in zip(sweeps, record.moments)
+            ],
+        )
+        # moments of the volume, for indexed queries
+        self._con.executemany(
+            "INSERT INTO moments VALUES (?, ?)",
+            [(record.path, moment) for moment in set().union(*record.moments)],
+        )
+
+    def update(
+        self,
+        paths,
+        pattern="*",
+        engine=None,
+        recursive=True,
+        parallel=False,
+        max_workers=None,
+    ):
+        """Add new and changed files to the catalog.
+
+        Files already in the catalog with unchanged modification time and size
+        are not scanned again.
+
+        Parameters
+        ----------
+        paths : str, os.PathLike or list
+            Files and/or directories to add.
+
+        Keyword Arguments
+        -----------------
+        pattern : str
+            Glob pattern of files to add from directories, defaults to "*".
+        engine : {"odim", "cfradial1"}, optional
+            Format of the files, guessed from the content if not given.
+        recursive : bool
+            Search directories recursively, defaults to True.
+        parallel : bool or str
+            Defaults to False. If True or "thread" files are scanned on a thread
+            pool, if "process" on a process pool.
+        max_workers : int, optional
+            Maximum number of workers for ``parallel``.
+
+        Returns
+        -------
+        count : int
+            Number of scanned (new or changed) files.
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        files = []
+        for path in map(os.fspath, paths):
+            if os.path.isdir(path):
+                sub = "**" if recursive else ""
+                found = glob.glob(os.path.join(path, sub, pattern), recursive=recursive)
+                files.extend(sorted(f for f in found if os.path.isfile(f)))
+            else:
+                files.append(path)
+
+        files = [os.path.abspath(f) for f in files]
+        stats = {f: os.stat(f) for f in files}
+        files = [f for f in files if not self._is_current(f, stats[f])]
+
+        records = _map_parallel(
+            partial(_scan_file, engine=engine),
+            files,
+            parallel=parallel,
+            max_workers=max_workers,
+        )
+        count = 0
+        with self._con:
+            for path, record in zip(files, records):
+                if isinstance(record, str):
+                    warnings.warn(
+                        f"xradar: skipping `{path}` in catalog, {record}", UserWarning
+                    )
+                    continue
+                self._insert(record, stats[path])
+                count += 1
+        return count
+
+    def prune(self):
+        """Remove files from the catalog, which do not exist anymore.
+
+        Returns
+        -------
+        count : int
+            Number of removed files.
+        """
+        paths = [
+            row[0]
+            for row in self._con.execute("SELECT path FROM volumes")
+            if not os.path.exists(row[0])
+        ]
+        with self._con:
+            self._con.executemany(
+                "DELETE FROM volumes WHERE path = ?", [(p,) for p in paths]
+            )
+        return len(paths)
+
+    def _get_records(self, rows, where, args):
+        # sweeps of all selected volumes in one query
+        sql = (
+            "SELECT path, sweep_number, sweep_mode, fixed_angle, nrays, nbins, "
+            "range_resolution, start_time, end_time, moments FROM sweeps "
+            "WHERE path IN (SELECT path FROM volumes"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += ") ORDER BY path, sweep_number"
+        sweeps = {}
+        for row in self._con.execute(sql, args):
+            sweeps.setdefault(row[0], []).append(row[1:])
+
+        records = []
+        for path, engine, longitude, latitude, altitude in rows:
+            swps = sweeps.get(path, [])
+            records.append(
+                VolumeRecord(
+                    path,
+                    engine,
+                    longitude,
+                    latitude,
+                    altitude,
+                    np.array([r[:-1] for r in swps], dtype=sweep_record_dtype),
+                    tuple(tuple(r[-1].split(",")) if r[-1] else () for r in swps),
+                )
+            )
+        return records
+
+    def query(
+        self,
+        start=None,
+        end=None,
+        site=None,
+        tolerance=0.01,
+        elevation_range=None,
+        fixed_angles=None,
+        moments=None,
+        engine=None,
+    ):
+        """Query volumes of the catalog.
+
+        Keyword Arguments
+        -----------------
+        start, end : str, datetime or numpy.datetime64, optional
+            Time window, volumes overlapping the window are returned.
+        site : tuple of float, optional
+            Radar site (longitude, latitude).
+        tolerance : float
+            Tolerance (degrees) for matching ``site``, defaults to 0.01.
+        elevation_range : tuple of float, optional
+            Only volumes having sweeps with fixed elevation within (lo, hi).
+        fixed_angles : float or list of float, optional
+            Only volumes having sweeps with any of the fixed angles (within 0.05).
+        moments : str or list of str, optional
+            Only volumes having all of the moments.
+        engine : {"odim", "cfradial1"}, optional
+            Only volumes of the format.
+
+        Returns
+        -------
+        records : list of xradar.io.scan.VolumeRecord
+            Matching volume records sorted by time.
+        """
+        where, args = [], []
+        if start is not None:
+            where.append("time_end >= ?")
+            args.append(_to_ms(start))
+        if end is not None:
+            where.append("time_start <= ?")
+            args.append(_to_ms(end))
+        if site is not None:
+            lon, lat = site
+            where.append("longitude BETWEEN ? AND ? AND latitude BETWEEN ? AND ?")
+            args.extend([lon - tolerance, lon + tolerance])
+            args.extend([lat - tolerance, lat + tolerance])
+        if engine is not None:
+            where.append("engine = ?")
+            args.append(engine)
+
+        # any sweep matching all angle predicates, RHI sweeps have no elevation
+        angle = []
+        if elevation_range is not None:
+            angle.append("s.sweep_mode != 'rhi' AND s.fixed_angle BETWEEN ? AND ?")
+            args.extend(elevation_range)
+        if fixed_angles is not None:
+            wanted = np.atleast_1d(np.asarray(fixed_angles, dtype=float)).tolist()
+            angle.append(
+                "(" + " OR ".join(["s.fixed_angle BETWEEN ? AND ?"] * len(wanted)) + ")"
+            )
+            args.extend(bound for a in wanted for bound in (a - 0.05, a + 0.05))
+        if angle:
+            where.append(
+                "EXISTS (SELECT 1 FROM sweeps s WHERE s.path = volumes.path AND "
+                + " AND ".join(angle)
+                + ")"
+            )
+
+        # all of the moments
+        if isinstance(moments, str):
+            moments = [moments]
+        if moments is not None:
+            moments = list(dict.fromkeys(moments))
+            where.append(
+                "path IN (SELECT path FROM moments WHERE moment IN ("
+                + ", ".join("?" * len(moments))
+                + ") GROUP BY path HAVING COUNT(*) = ?)"
+            )
+            args.extend(moments + [len(moments)])
+
+        sql = "SELECT path, engine, longitude, latitude, altitude FROM volumes"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY time_start, path"
+        rows = self._con.execute(sql, args).fetchall()
+        return self._get_records(rows, where, args)
+
+    def open_datatrees(
+        self,
+        start=None,
+        end=None,
+        site=None,
+        tolerance=0.01,
+        elevation_range=None,
+        fixed_angles=None,
+        moments=None,
+        engine=None,
+        **kwargs,
+    ):
+        """Open queried volumes as :py:class:`datatree.DataTree`.
+
+        The volumes are opened using :func:`xradar.io.open_odim_datatree` or
+        :func:`xradar.io.open_cfradial1_datatree`, only sweeps matching
+        ``elevation_range`` and ``fixed_angles`` are extracted. See
+        :meth:`query` for the filter keyword arguments.
+
+        Keyword Arguments
+        -----------------
+        **kwargs : dict
+            Additional kwargs are fed to the datatree functions.
+
+        Returns
+        -------
+        dtrees : list of datatree.DataTree
+            Matching volumes sorted by time.
+        """
+        records = self.query(
+            start=start,
+            end=end,
+            site=site,
+            tolerance=tolerance,
+            elevation_range=elevation_range,
+            fixed_angles=fixed_angles,
+            moments=moments,
+            engine=engine,
+        )
+        if elevation_range is not None:
+            kwargs["elevation_range"] = elevation_range
+        if fixed_angles is not None:
+            kwargs["fixed_angles"] = fixed_angles
+        dtrees = []
+        for rec in records:
+            opts = dict(kwargs)
+            # only ODIM supports reading selected moments
+            if moments is not None and rec.engine == "odim":
+                opts.setdefault("moments", moments)
+            dtrees.append(_openers[rec.engine](rec.path, **opts))
+        return dtrees
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# Copyright (c) 2022, openradar developers.
+# Distributed under the MIT License. See LICENSE for more info.
+
+"""
+
+Volume Loading
+==============
+
+This sub-module contains the concurrent loading of lazily opened volumes
+(datatree.Datatree) without dask. All lazy variables of all sweeps are read on a
+thread pool. The file access is guarded by the per-file locks of the backends, so
+reading, decompression and decoding of different files and of unlocked (eg.
+memory-mapped) moments overlap.
+
+Example::
+
+    import xradar as xd
+    dtree = xd.io.open_odim_datatree(filename)
+    info = xd.io.load_volume(dtree, max_workers=8)
+    info.throughput / 2**20  # MiB/s
+
+.. autosummary::
+   :nosignatures:
+   :toctree: generated/
+
+   {}
+
+"""
+
+__all__ = [
+    "LoadInfo",
+    "load_volume",
+]
+
+__doc__ = __doc__.format("\n   ".join(__all__))
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+LoadInfo = namedtuple("LoadInfo", ["variables", "nbytes", "elapsed", "throughput"])
+
+
+def load_volume(dtree, max_workers=None):
+    """Load all lazy variables of a volume concurrently into memory.
+
+    Like :py:meth:`datatree.DataTree.load` the DataTree is modified in place. Lazy
+    backend variables are loaded on a thread pool, largest first. Dask-backed
+    variables are computed together in one :py:func:`dask.compute` call.
+
+    Parameters
+    ----------
+    dtree : datatree.DataTree
+        Volume as returned by eg. :func:`xradar.io.open_odim_datatree` or
+        :func:`xradar.io.open_cfradial1_datatree`.
+    max_workers : int, optional
+        Maximum number of threads, defaults to the executors default.
+
+    Returns
+    -------
+    info : namedtuple
+        variables (number of loaded variables), nbytes (loaded bytes), elapsed
+        (seconds) and throughput (bytes per second).
+    """
+    variables = {
+        id(var): var for node in dtree.subtree for var in node.variables.values()
+    }.values()
+    # chunks are only set for dask-backed variables
+    chunked = [var for var in variables if var.chunks is not None]
+    lazy = [var for var in variables if not var._in_memory and var.chunks is None]
+    # largest first for better balancing of the workers
+    lazy.sort(key=lambda var: var.size * var.dtype.itemsize, reverse=True)
+
+    start = time.perf_counter()
+    if chunked:
+        import dask
+
+        kwargs = {} if max_workers is None else {"num_workers": max_workers}
+        for var, data in zip(
+            chunked, dask.compute(*[v.data for v in chunked], **kwargs)
+        ):
+            var.data = data
+    if len(lazy) > 1 and max_workers != 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            list(ex.map(lambda var: var.load(), lazy))
+    else:
+        for var in lazy:
+            var.load()
+    elapsed = time.perf_counter() - start
+
+    nbytes = sum(var.nbytes for var in lazy + chunked)
+    throughput = nbytes / elapsed if elapsed > 0 else float("inf")
+    return LoadInfo(len(lazy) + len(chunked), nbytes, elapsed, throughput)
@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+# Copyright (c) 2022, openradar developers.
+# Distributed under the MIT License. See LICENSE for more info.
+
+"""
+
+Reference Index
+===============
+
+This sub-module contains tools to create a (kerchunk-style) byte-range reference
+index of ODIM_H5 and CfRadial1 files and to open such an index as datatree.Datatree.
+
+The index is created by scanning the file once. For every moment variable the byte
+offset and length of each stored chunk, the compression filters and the dtype are
+recorded. Coordinates, metadata and attributes are stored decoded (inline) in the
+index. The reader fetches the chunks with plain file reads and decodes them with
+:py:mod:`numcodecs`, the HDF5 library is not used.
+
+Example::
+
+    import xradar as xd
+    index = xd.io.create_reference_index(filename, engine="odim", outfile="ref.json")
+    dtree = xd.io.open_reference_datatree("ref.json")
+
+.. autosummary::
+   :nosignatures:
+   :toctree: generated/
+
+   {}
+
+"""
+
+__all__ = [
+    "create_reference_index",
+    "open_reference_datatree",
+]
+
+__doc__ = __doc__.format("\n   ".join(__all__))
+
+import itertools
+import json
+import os
+
+import h5py
+import numpy as np
+import xarray as xr
+from datatree import DataTree
+from xarray.backends import NetCDF4DataStore
+from xarray.backends.common import AbstractDataStore, BackendArray
+from xarray.core import indexing
+from xarray.core.utils import FrozenDict
+from xarray.core.variable import Variable
+
+from .backends.cfradial1 import open_cfradial1_datatree
+from .backends.common import _attach_sweep_groups, _get_compression
+from .backends.odim import (
+    OdimStore,
+    _assign_root,
+    _get_h5group_names,
+    _get_odim_root_dataset,
+    _open_odim_volume_store,
+)
+
+REFERENCE_INDEX_VERSION = 1
+
+# encoding keys, which are kept in the index
+_ENCODING_KEYS = [
+    "chunksizes",
+    "zlib",
+    "complevel",
+    "shuffle",
+    "fletcher32",
+    "contiguous",
+    "original_shape",
+    "group",
+]
+
+
+def _encode_array(values):
+    """Encode array as json serializable dict."""
+    values = np.asarray(values)
+    data = values.ravel().tolist()
+    if values.dtype.kind == "S":
+        data = [v.decode("latin-1") for v in data]
+    return {"dtype": values.dtype.str, "shape": list(values.shape), "data": data}
+
+
+def _decode_array(obj):
+    """Decode array from json serializable dict."""
+    dtype = np.dtype(obj["dtype"])
+    if dtype.kind == "S":
+        data = [v.encode("latin-1") for v in obj["data"]]
+    else:
+        data = obj["data"]
+    return np.array(data, dtype=dtype).reshape(obj["shape"])
+
+
+def _encode_value(value):
+    """Encode attribute or encoding value as json serializable object."""
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": _encode_array(value)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode("latin-1")
+    if isinstance(value, tuple):
+        return [_encode_value(v) for v in value]
+    return value
+
+
+def _decode_value(value):
+    """Decode attribute or encoding value from json serializable object."""
+    if isinstance(value, dict) and "__ndarray__" in value:
+        return _decode_array(value["__ndarray__"])
+    return value
+
+
+def _encode_attrs(attrs):
+    return {k: _encode_value(v) for k, v in attrs.items()}
+
+
+def _decode_attrs(attrs):
+    return {k: _decode_value(v) for k, v in attrs.items()}
+
+
+def _get_h5_filters(h5ds):
+    """Get numcodecs configurations of HDF5 filter pipeline (encoding order)."""
+    filters = []
+    for name, opts in h5ds._filters.items():
+        if name == "shuffle":
+            filters.append({"id": "shuffle", "elementsize": h5ds.dtype.itemsize})
+        elif name == "gzip":
+            filters.append({"id": "zlib", "level": opts})
+        else:
+            raise ValueError(
+                f"xradar: HDF5 filter `{name}` of `{h5ds.name}` is not supported."
+            )
+    return filters
+
+
+def _get_h5_chunk_refs(h5ds):
+    """Get chunk shape and byte-ranges of all stored chunks of h5py Dataset."""
+    dsid = h5ds.id
+    refs = {}
+    if h5ds.chunks is None:
+        chunks = h5ds.shape
+        offset = dsid.get_offset()
+        if offset is not None:
+            refs[".".join(["0"] * h5ds.ndim)] = [offset, dsid.get_storage_size()]
+    else:
+        chunks = h5ds.chunks
+        for i in range(dsid.get_num_chunks()):
+            info = dsid.get_chunk_info(i)
+            if info.filter_mask:
+                raise ValueError(
+                    f"xradar: unfiltered chunks of `{h5ds.name}` are not supported."
+                )
+            key = ".".join(str(o // c) for o, c in zip(info.chunk_offset, chunks))
+            refs[key] = [info.byte_offset, info.size]
+    return list(chunks), refs
+
+
+def _encode_variable(var, h5ds=None):
+    """Encode Variable, moments given by h5py Dataset are stored as references."""
+    obj = {
+        "dims": list(var.dims),
+        "attrs": _encode_attrs(var.attrs),
+        "encoding": _encode_attrs(
+            {k: v for k, v in var.encoding.items() if k in _ENCODING_KEYS}
+        ),
+    }
+    if h5ds is None:
+        obj["values"] = _encode_array(var.values)
+    else:
+        chunks, refs = _get_h5_chunk_refs(h5ds)
+        fill_value = h5ds.fillvalue
+        obj["reference"] = {
+            "dtype": h5ds.dtype.str,
+            "shape": list(h5ds.shape),
+            "chunks": chunks,
+            "filters": _get_h5_filters(h5ds),
+            "fill_value": None if fill_value is None else _encode_value(fill_value),
+            "refs": refs,
+        }
+    return obj
+
+
+def _encode_store(store, get_h5ds):
+    """Encode variables and attributes of xarray DataStore."""
+    variables, attrs = store.load()
+    return {
+        "attrs": _encode_attrs(attrs),
+        "variables": {
+            name: _encode_variable(var, h5ds=get_h5ds(name, var))
+            for name, var in variables.items()
+        },
+    }
+
+
+def _create_odim_index(filename):
+    """Create reference index groups of ODIM_H5 file."""
+    store = _open_odim_volume_store(filename, {})
+    with store._manager.acquire_context(False) as root:
+        sweeps = _get_h5group_names(root, "odim")
+
+        def get_h5ds(name, var):
+            # moments are read from the ``dataN``/``qualityN`` subgroups
+            group = var.encoding.get("group", None)
+            if group is None:
+                return None
+            return root[group.lstrip("/")].variables["data"]._h5ds
+
+        root_ds = _get_odim_root_dataset(store, sweeps)
+        groups = {
+            "/": {
+                "attrs": _encode_attrs(root_ds.attrs),
+                "variables": {
+                    name: _encode_variable(var)
+                    for name, var in root_ds.variables.items()
+                },
+            }
+        }
+        for sweep in sweeps:
+            sweep_store = OdimStore(
+                store._manager, group=sweep, lock=store.lock, use_mmap=False
+            )
+            groups[sweep] = _encode_store(sweep_store, get_h5ds)
+    store.close()
+    return groups
+
+
+def _create_cfradial1_index(filename):
+    """Create reference index groups of CfRadial1 (netCDF4/HDF5) file."""
+    store = NetCDF4DataStore.open(filename, group=None)
+    with h5py.File(filename, "r") as h5file:
+
+        def get_h5ds(name, var):
+            # (time, range) and ragged (n_points) moments
+            if var.dtype.kind not in "biuf":
+                return None
+            if var.ndim < 2 and "n_points" not in var.dims:
+                return None
+            return h5file[name]
+
+        groups = {"/": _encode_store(store, get_h5ds)}
+    store.close()
+    return groups
+
+
+def create_reference_index(filename, engine, outfile=None):
+    """Create byte-range reference index of ODIM_H5 or CfRadial1 file.
+
+    The file is scanned once. For every moment the byte-ranges of the stored
+    chunks, the compression filters and the dtype are recorded, coordinates and
+    attributes are stored decoded.
+
+    Parameters
+    ----------
+    filename : str or os.PathLike
+        Local ODIM_H5 or CfRadial1 (netCDF4/HDF5) file.
+    engine : {"odim", "cfradial1"}
+        Format of the file.
+
+    Keyword Arguments
+    -----------------
+    outfile : str or os.PathLike, optional
+        If given, the index is written as json to this file.
+
+    Returns
+    -------
+    index : dict
+        Json serializable reference index.
+    """
+    if _get_compression(filename) is not None:
+        raise ValueError(
+            f"xradar: can't create reference index of compressed file `{filename}`."
+        )
+    if engine == "odim":
+        groups = _create_odim_index(filename)
+    elif engine == "cfradial1":
+        groups = _create_cfradial1_index(filename)
+    else:
+        raise ValueError(f"xradar: unknown engine `{engine}`.")
+
+    index = {
+        "version": REFERENCE_INDEX_VERSION,
+        "engine": engine,
+        "source": os.path.abspath(filename),
+        "groups": groups,
+    }
+    if outfile is not None:
+        with open(outfile, "w") as f:
+            json.dump(index, f)
+    return index
+
+
+class _ReferenceArray(BackendArray):
+    """Array reading referenced chunks with plain file reads and numcodecs."""
+
+    def __init__(self, filename, reference):
+        self.filename = filename
+        self.shape = tuple(reference["shape"])
+        self.dtype = np.dtype(reference["dtype"])
+        self.chunks = tuple(reference["chunks"])
+        self.filters = reference["filters"]
+        self.fill_value = reference["fill_value"]
+        self.refs = reference["refs"]
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._getitem
+        )
+
+    def _decode_chunk(self, raw, codecs):
+        for codec in reversed(codecs):
+            raw = codec.decode(raw)
+        return np.frombuffer(raw, dtype=self.dtype).reshape(self.chunks)
+
+    def _getitem(self, key):
+        import numcodecs
+
+        codecs = [numcodecs.get_codec(dict(config)) for config in self.filters]
+
+        # bounding hyperslab of outer indexer
+        subkey = []
+        starts, stops = [], []
+        for k, size in zip(key, self.shape):
+            idx = np.arange(size)[k]
+            start, stop = (int(idx.min()), int(idx.max()) + 1) if idx.size else (0, 0)
+            starts.append(start)
+            stops.append(stop)
+            subkey.append(idx - start)
+
+        out = np.full(
+            [stop - start for start, stop in zip(starts, stops)],
+            0 if self.fill_value is None else self.fill_value,
+            dtype=self.dtype,
+        )
+        if out.size:
+            offsets = itertools.product(
+                *[
+                    range(start - start % chunk, stop, chunk)
+                    for start, stop, chunk in zip(starts, stops, self.chunks)
+                ]
+            )
+            with open(self.filename, "rb") as fh:
+                for offset in offsets:
+                    ckey = ".".join(str(o // c) for o, c in zip(offset, self.chunks))
+                    if ckey not in self.refs:
+                        continue
+                    pos, length = self.refs[ckey]
+                    fh.seek(pos)
+                    data = self._decode_chunk(fh.read(length), codecs)
+                    src, dst = [], []
+                    for off, start, stop, size in zip(
+                        offset, starts, stops, self.chunks
+                    ):
+                        lo, hi = max(off, start), min(off + size, stop)
+                        src.append(slice(lo - off, hi - off))
+                        dst.append(slice(lo - start, hi - start))
+                    out[tuple(dst)] = data[tuple(src)]
+
+        # outer indexing of the hyperslab, one axis after another
+        for axis, k in reversed(list(enumerate(subkey))):
+            out = np.take(out, k, axis=axis)
+        return out
+
+
+class _ReferenceStore(AbstractDataStore):
+    """Store serving one group of reference index."""
+
+    # used by the ODIM backend when removing duplicate rays
+    _need_time_recalc = False
+
+    def __init__(self, group, filename):
+        self._group = group
+        self._filename = filename
+
+    def _decode_variable(self, obj):
+        encoding = _decode_attrs(obj["encoding"])
+        if "reference" in obj:
+            array = _ReferenceArray(self._filename, obj["reference"])
+            data = indexing.LazilyIndexedArray(array)
+            encoding["source"] = self._filename
+        else:
+            data = _decode_array(obj["values"])
+        return Variable(obj["dims"], data, _decode_attrs(obj["attrs"]), encoding)
+
+    def get_variables(self):
+        return FrozenDict(
+            (name, self._decode_variable(obj))
+            for name, obj in self._group.get("variables", {}).items()
+        )
+
+    def get_attrs(self):
+        return FrozenDict(_decode_attrs(self._group["attrs"]))
+
+    def get_encoding(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def open_reference_datatree(index, source=None, **kwargs):
+    """Open reference index as :py:class:`datatree.DataTree`.
+
+    Moments are read lazily with plain file reads from the referenced file and
+    decoded using :py:mod:`numcodecs`.
+
+    Parameters
+    ----------
+    index : dict, str or os.PathLike
+        Reference index or json file as created by
+        :func:`xradar.io.reference.create_reference_index`.
+
+    Keyword Arguments
+    -----------------
+    source : str or os.PathLike, optional
+        Location of the referenced file, defaults to the source recorded in the
+        index. Useful, if the archive was moved.
+    **kwargs : dict
+        Additional kwargs are fed to the backend of the indexed format
+        (eg. ``first_dim``, ``decode_dtype`` or ``chunks``).
+
+    Returns
+    -------
+    dtree : datatree.DataTree
+        DataTree with CfRadial2 groups.
+    """
+    if not isinstance(index, dict):
+        with open(index) as f:
+            index = json.load(f)
+    if index["version"] != REFERENCE_INDEX_VERSION:
+        raise ValueError(
+            f"xradar: unsupported reference index version `{index['version']}`."
+        )
+    filename = os.fspath(source or index["source"])
+    groups = index["groups"]
+    engine = index["engine"]
+
+    if engine == "cfradial1":
+        return open_cfradial1_datatree(_ReferenceStore(groups["/"], filename), **kwargs)
+
+    if engine != "odim":
+        raise ValueError(f"xradar: unknown engine `{engine}`.")
+
+    sweeps = [
+        xr.open_dataset(_ReferenceStore(groups[grp], filename), engine="odim", **kwargs)
+        for grp in groups
+        if grp != "/"
+    ]
+    root_store = _ReferenceStore(groups["/"], filename)
+    root = xr.Dataset(dict(root_store.get_variables()), attrs=root_store.get_attrs())
+    # create datatree root node with required data
+    dtree = DataTree(data=_assign_root([root] + sweeps), name="root")
+    # return datatree with attached sweep child nodes
+    return _attach_sweep_groups(dtree, sweeps)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# Copyright (c) 2022, openradar developers.
+# Distributed under the MIT License. See LICENSE for more info.
+
+"""
+
+Volume Scan
+===========
+
+This sub-module contains a metadata-only scan of ODIM_H5 and CfRadial1 volumes, eg.
+for building catalogs of large archives. No xarray structures are created and no
+moment data is read, only the attributes and small metadata variables.
+
+Example::
+
+    import xradar as xd
+    record = xd.io.scan_volume(filename)
+    record.sweeps["fixed_angle"]
+
+.. autosummary::
+   :nosignatures:
+   :toctree: generated/
+
+   {}
+
+"""
+
+__all__ = [
+    "VolumeRecord",
+    "scan_volume",
+    "sweep_record_dtype",
+]
+
+__doc__ = __doc__.format("\n   ".join(__all__))
+
+import os
+
+import h5py
+import numpy as np
+
+from .backends.cfradial1 import _scan_cfradial1_volume
+from .backends.odim import _scan_odim_volume
+
+#: dtype of the per sweep metadata records
+sweep_record_dtype = np.dtype(
+    [
+        ("sweep_number", "i4"),
+        ("sweep_mode", "U24"),
+        ("fixed_angle", "f4"),
+        ("nrays", "i4"),
+        ("nbins", "i4"),
+        ("range_resolution", "f4"),
+        ("start_time", "M8[ms]"),
+        ("end_time", "M8[ms]"),
+    ]
+)
+
+_scanners = {
+    "odim": _scan_odim_volume,
+    "cfradial1": _scan_cfradial1_volume,
+}
+
+
+class VolumeRecord:
+    """Compact metadata record of one radar volume.
+
+    Attributes
+    ----------
+    path : str
+        Path of the scanned file.
+    engine : str
+        Format of the file ("odim" or "cfradial1").
+    longitude, latitude, altitude : float
+        Radar site coordinates.
+    sweeps : numpy.ndarray
+        Structured array with one record per sweep, see
+        :py:data:`xradar.io.scan.sweep_record_dtype`.
+    moments : tuple of tuple
+        Moment names per sweep.
+    """
+
+    __slots__ = (
+        "path",
+        "engine",
+        "longitude",
+        "latitude",
+        "altitude",
+        "sweeps",
+        "moments",
+    )
+
+    def __init__(self, path, engine, longitude, latitude, altitude, sweeps, moments):
+        self.path = path
+        self.engine = engine
+        self.longitude = longitude
+        self.latitude = latitude
+        self.altitude = altitude
+        self.sweeps = sweeps
+        self.moments = moments
+
+    @property
+    def nsweeps(self):
+        return len(self.sweeps)
+
+    @property
+    def time_coverage_start(self):
+        return self.sweeps["start_time"].min() if self.nsweeps else None
+
+    @property
+    def time_coverage_end(self):
+        return self.sweeps["end_time"].max() if self.nsweeps else None
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} {self.engine} {self.path!r} "
+            f"sweeps={self.nsweeps} "
+            f"time=[{self.time_coverage_start}, {self.time_coverage_end}]>"
+        )
+
+
+def _guess_engine(filename):
+    """Guess engine from file content."""
+    if h5py.is_hdf5(filename):
+        with h5py.File(filename, "r") as fh:
+            conventions = fh.attrs.get("Conventions", b"")
+            if isinstance(conventions, bytes):
+                conventions = conventions.decode()
+            if conventions.startswith("ODIM") or "what" in fh:
+                return "odim"
+    return "cfradial1"
+
+
+def scan_volume(path, engine=None):
+    """Scan metadata of ODIM_H5 or CfRadial1 volume.
+
+    Only attributes and small metadata variables are read, using the same
+    attribute readers as the backends.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Path of the volume file.
+
+    Keyword Arguments
+    -----------------
+    engine : {"odim", "cfradial1"}, optional
+        Format of the file, guessed from the content if not given.
+
+    Returns
+    -------
+    record : xradar.io.scan.VolumeRecord
+        Metadata record of the volume.
+    """
+    path = os.fspath(path)
+    if engine is None:
+        engine = _guess_engine(path)
+    try:
+        scanner = _scanners[engine]
+    except KeyError:
+        raise ValueError(f"xradar: unknown engine `{engine}`.")
+    site, sweeps, moments = scanner(path)
+    if site is None:
+        site = (np.nan, np.nan, np.nan)
+    return VolumeRecord(
+        path,
+        engine,
+        *site,
+        np.array(sweeps, dtype=sweep_record_dtype),
+        tuple(moments),
+    )